@@ -1,77 +1,366 @@
 import asyncio
-import datetime
+import multiprocessing
+import signal
+from typing import Dict, List, Optional
 
 from redis.asyncio import Redis
 
 from app.client import ConnectionProvider, Connection
 from app.client.serialclient import SerialConfig
+from app.client.serialclient.capture import CaptureWriter
+from app.client.serialclient.discovery import PortDiscovery
+from app.client.serialclient.replay import ReplayConnection
 from app.config.config import Config
+from app.controller.aggregationcontroller.aggregationcontroller import AggregationController
+from app.controller.archivecontroller.archivecontroller import ArchiveController
 from app.controller.configcontroller.configcontroller import ConfigController
+from app.controller.derivedcontroller.derivedcontroller import DerivedController
+from app.controller.diagnosticscontroller.diagnosticscontroller import DiagnosticsController
 from app.controller.landcontroller.landcontroller import LandController
+from app.controller.metricscontroller.metricscontroller import MetricsController
+from app.controller.snapshotcontroller.snapshotcontroller import SnapshotController
+from app.controller.statuscontroller.statuscontroller import StatusController
+from app.controller.telemetrycontroller.models import telemetry_frame_model
 from app.controller.telemetrycontroller.telemetrycontroller import TelemetryController
 from app.handler import SerialHandler, RedisHandler
+from app.metrics import Metrics
 from app.payloads import PayloadType
 from app.replacement.logs import setup_logger
-from app.status import AppStatus
+from app.scheduler import Scheduler
 
 
-class ConnectorApp:
-    allowed_payload_types = [PayloadType.status_update]
+class DeviceLink:
+    """Everything one serial device needs: the connection with its reader and
+    writer tasks, and its own telemetry pipeline.
+
+    ``name`` is None for the single device configured by ``serial_*``, named
+    devices of ``serial_devices`` get their own channels, stream and files,
+    see ``Config.device_config``, and their own metrics, named
+    ``<device>_<metric>``.
+    """
 
-    def __init__(self, config: Config):
+    def __init__(self, name: Optional[str], serial_config: SerialConfig, config: Config, redis: Redis,
+                 scheduler: Scheduler, metrics: Metrics):
+        self.name = name
         self.config = config
-        self.status = AppStatus.Starting
-        self.status_time = datetime.datetime.now()
+        suffix = f".{name}" if name else ""
+        if name:
+            metrics = metrics.scoped(name)
+        self.metrics = metrics
 
-        self.connection = Connection(
-            setup_logger("connection", config),
-            SerialConfig(),
-        )
+        if config.serial_replay_path:
+            self.connection = ReplayConnection(
+                setup_logger(f"connection{suffix}", config),
+                serial_config,
+                config.serial_replay_path,
+                config.serial_replay_speed,
+                metrics,
+            )
+        else:
+            self.connection = Connection(
+                setup_logger(f"connection{suffix}", config),
+                serial_config,
+                PortDiscovery(
+                    setup_logger(f"port_discovery{suffix}", config),
+                    config.serial_discovery_match,
+                    config.serial_probe_timeout,
+                    config.serial_port_cache,
+                    config.serial_discovery_vid,
+                    config.serial_discovery_pid,
+                ),
+                name,
+                CaptureWriter.in_directory(config.serial_capture_path, name) if config.serial_capture_path else None,
+                metrics,
+            )
         self.connection_provider = ConnectionProvider(
-            self.connection
-        )
-        self.redis = Redis().from_url(str(config.redis_dsn))
-
-        self.config_controller = ConfigController(
-            setup_logger("config_controller", config),
-            self.connection_provider,
-            self.redis,
-            self.config,
-        )
-        self.land_controller = LandController(
-            setup_logger("land_controller", config),
-            self.connection_provider,
+            setup_logger(f"connection_provider{suffix}", config),
+            self.connection,
+            config.serial_queue_writes,
+            metrics,
         )
         self.telemetry_controller = TelemetryController(
-            setup_logger("telemetry_controller", config),
-            self.redis,
-            self.config,
+            setup_logger(f"telemetry_controller{suffix}", config),
+            redis,
+            config,
+            metrics,
         )
+        self.controllers = [self.telemetry_controller]
+        if config.telemetry_aggregation_enabled:
+            self.aggregation_controller = AggregationController(
+                setup_logger(f"aggregation_controller{suffix}", config),
+                redis,
+                scheduler,
+                config,
+            )
+            self.telemetry_controller.add_stage(self.aggregation_controller)
+            self.controllers.append(self.aggregation_controller)
+        self.derived_controller: Optional[DerivedController] = None
+        if config.telemetry_derived_enabled:
+            self.derived_controller = DerivedController(
+                setup_logger(f"derived_controller{suffix}", config),
+                redis,
+                config,
+            )
+            self.telemetry_controller.add_stage(self.derived_controller)
+            self.controllers.append(self.derived_controller)
+        if config.telemetry_snapshot_enabled:
+            snapshot_controller = SnapshotController(
+                setup_logger(f"snapshot_controller{suffix}", config),
+                config,
+            )
+            self.telemetry_controller.add_stage(snapshot_controller)
+            self.controllers.append(snapshot_controller)
+        if config.telemetry_archive_enabled:
+            archive_controller = ArchiveController(
+                setup_logger(f"archive_controller{suffix}", config),
+                scheduler,
+                config,
+            )
+            self.telemetry_controller.add_stage(archive_controller)
+            self.controllers.append(archive_controller)
+        self.serial_handler: Optional[SerialHandler] = None
 
-        self.redis_handler = RedisHandler(
-            setup_logger("redis_handler", config),
-            self.config_controller,
-            self.land_controller,
-            self.redis,
-            self.config,
-        )
+    def attach_handler(self, land_controller: Optional[LandController]):
+        suffix = f".{self.name}" if self.name else ""
         self.serial_handler = SerialHandler(
-            setup_logger("serial_handler", config),
+            setup_logger(f"serial_handler{suffix}", self.config),
             self.connection_provider,
             self.telemetry_controller,
+            land_controller,
+            telemetry_frame_model(self.telemetry_controller.fields),
+            self.metrics,
         )
 
-        self.handlers = [
-            self.serial_handler,
-            self.redis_handler,
-        ]
+
+def run_worker(device: str):
+    """Entry point of a worker process running a single sharded device."""
+    app = ConnectorApp(Config(), [device])
+    try:
+        asyncio.run(app.run())
+    except KeyboardInterrupt:
+        pass
+
+
+class ConnectorApp:
+    """One process serving one or more serial devices.
+
+    Without ``serial_devices`` it runs the single device configured by
+    ``serial_*`` as before. Otherwise every named device gets its own link,
+    devices marked ``worker`` run in a child process each (see
+    ``run_worker``), the rest share this process, its event loop and its
+    Redis pool. Land messages and serial config updates go to the primary
+    device only.
+
+    A worker runs the telemetry pipeline of its device and nothing else: its
+    queue is not part of the status updates of the main process and derived
+    telemetry resets do not reach it.
+    """
+    allowed_payload_types = [PayloadType.status_update]
+    worker_restart_delay = 1.0
+    worker_stop_timeout = 10.0
+
+    def __init__(self, config: Config, devices: Optional[List[str]] = None):
+        self.config = config
+        self.is_worker = devices is not None
+        self.logger = setup_logger("app", config)
+        self.stopping = asyncio.Event()
+        self.metrics = Metrics(enabled=config.metrics_enabled)
+        self.scheduler = Scheduler(setup_logger("scheduler", config), self.metrics)
+        self.redis = Redis().from_url(str(config.redis_dsn))
+
+        self.links: List[DeviceLink] = []
+        self.worker_devices: List[str] = []
+        self.workers: Dict[str, multiprocessing.Process] = {}
+        if not config.serial_devices:
+            self.links.append(DeviceLink(None, SerialConfig(), config, self.redis, self.scheduler, self.metrics))
+        for name, device in config.serial_devices.items():
+            if devices is not None and name not in devices:
+                continue
+            if device.worker and not self.is_worker:
+                self.worker_devices.append(name)
+                continue
+            self.links.append(DeviceLink(
+                name,
+                SerialConfig(**device.model_dump(include=set(SerialConfig.model_fields))),
+                config.device_config(name, device),
+                self.redis,
+                self.scheduler,
+                self.metrics,
+            ))
+
+        self.controllers = []
+        for link in self.links:
+            self.controllers.extend(link.controllers)
+
+        self.handlers = []
+        primary = None if self.is_worker else self.primary_link()
+        self.land_controller = None
+        if primary is not None:
+            self.connection = primary.connection
+            self.connection_provider = primary.connection_provider
+            self.telemetry_controller = primary.telemetry_controller
+
+            self.config_controller = ConfigController(
+                setup_logger("config_controller", config),
+                self.connection_provider,
+                self.redis,
+                self.scheduler,
+                self.config,
+            )
+            self.status_controller = StatusController(
+                setup_logger("status_controller", config),
+                self.redis,
+                self.scheduler,
+                [link.connection for link in self.links],
+                {link.name or 'default': link.telemetry_controller for link in self.links},
+                self.config,
+            )
+            self.land_controller = LandController(
+                setup_logger("land_controller", config),
+                self.connection_provider,
+                self.redis,
+                self.config,
+            )
+            self.controllers.extend([self.land_controller, self.config_controller, self.status_controller])
+            self.diagnostics_controller: Optional[DiagnosticsController] = None
+            if config.diagnostics_enabled:
+                self.diagnostics_controller = DiagnosticsController(
+                    setup_logger("diagnostics_controller", config),
+                    self.redis,
+                    self.metrics,
+                    self.config,
+                )
+                self.controllers.append(self.diagnostics_controller)
+            self.redis_handler = RedisHandler(
+                setup_logger("redis_handler", config),
+                self.config_controller,
+                self.land_controller,
+                self.redis,
+                self.config,
+                [link.derived_controller for link in self.links if link.derived_controller is not None],
+                self.diagnostics_controller,
+                self.metrics,
+            )
+            self.handlers.append(self.redis_handler)
+
+        for link in self.links:
+            link.attach_handler(self.land_controller if link is primary else None)
+            self.handlers.insert(0, link.serial_handler)
+        if primary is not None:
+            self.serial_handler = primary.serial_handler
+
+        if config.metrics_enabled:
+            metrics_config = self.config
+            if self.is_worker:
+                # workers publish next to the main process and serve no endpoint
+                metrics_config = config.model_copy(update={
+                    'redis_metrics_key': f"{config.redis_metrics_key}:{':'.join(devices)}",
+                    'metrics_port': None,
+                })
+            self.metrics_controller = MetricsController(
+                setup_logger("metrics_controller", config),
+                self.redis,
+                self.scheduler,
+                self.metrics,
+                metrics_config,
+            )
+            self.controllers.append(self.metrics_controller)
+
+    def primary_link(self) -> Optional[DeviceLink]:
+        name = self.config.serial_primary_device
+        for link in self.links:
+            if name is None or link.name == name:
+                return link
+        if name is None:
+            raise ValueError("the primary device can not run in a worker process")
+        if name in self.worker_devices:
+            raise ValueError(f"primary device {name} can not run in a worker process")
+        raise ValueError(f"unknown primary device {name}")
 
     async def run(self):
-        for f in self.handlers:
-            await f.init()
+        self.install_signal_handlers()
 
+        await self.scheduler.start()
+        for link in self.links:
+            await link.connection_provider.start()
+        for c in self.controllers:
+            await c.start()
         futures = []
-        for f in self.handlers:
-            futures.append(asyncio.create_task(f.run()))
+        try:
+            for f in self.handlers:
+                await f.init()
 
+            for f in self.handlers:
+                futures.append(asyncio.create_task(f.run()))
+            for name in self.worker_devices:
+                futures.append(asyncio.create_task(self.supervise_worker(name)))
+            for link in self.links:
+                if isinstance(link.connection, ReplayConnection):
+                    futures.append(asyncio.create_task(self.stop_after_replay(link)))
+
+            await self.stopping.wait()
+        finally:
+            await self.shutdown(futures)
+
+    def stop(self):
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    async def stop_after_replay(self, link: DeviceLink):
+        """Stops the app once a replayed capture went through the pipeline."""
+        await link.connection.finished.wait()
+        while not link.connection_provider.read_queue.empty():
+            await asyncio.sleep(0.05)
+        # let the serial handler finish the last batch it took from the queue
+        await asyncio.sleep(0.5)
+        self.stop()
+
+    async def supervise_worker(self, name: str):
+        """Runs the worker process of device ``name``, restarting it when it dies."""
+        context = multiprocessing.get_context('spawn')
+        while True:
+            process = context.Process(target=run_worker, args=(name,), name=f"connector-{name}", daemon=True)
+            process.start()
+            self.workers[name] = process
+            self.logger.info(f"device {name} runs in worker process {process.pid}")
+            await asyncio.to_thread(process.join)
+            self.logger.error(f"worker of device {name} exited with {process.exitcode}, "
+                              f"restarting in {self.worker_restart_delay:.1f} sec")
+            await asyncio.sleep(self.worker_restart_delay)
+
+    async def stop_workers(self):
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        for name, process in self.workers.items():
+            await asyncio.to_thread(process.join, self.worker_stop_timeout)
+            if process.is_alive():
+                self.logger.error(f"worker of device {name} did not stop, killing it")
+                process.kill()
+        self.workers = {}
+
+    async def shutdown(self, futures):
+        for f in futures:
+            f.cancel()
         await asyncio.gather(*futures, return_exceptions=True)
+        await self.stop_workers()
+
+        for f in self.handlers:
+            try:
+                await f.shutdown()
+            except Exception as ex:
+                self.logger.error(str(ex))
+
+        for link in self.links:
+            await link.connection_provider.stop()
+        for c in reversed(self.controllers):
+            await c.stop()
+        await self.scheduler.stop()
+        await self.redis.close()
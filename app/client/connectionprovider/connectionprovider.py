@@ -1,16 +1,117 @@
-from asyncio import Lock
+import asyncio
+import time
+from asyncio import Lock, Queue
+from logging import Logger
+from typing import List, Tuple
 
+from app.errors import SerialReadError, SerialWriteError
+from app.metrics import Metrics, disabled_metrics
 from .. import Connection
+from ..serialclient import SerialConfig
 
 
 class ConnectionProvider:
-    def __init__(self, conn: Connection):
+    """Owns the serial port through a reader and a writer task.
+
+    The rest of the app talks to the port through bounded queues, so reads and
+    writes overlap and nobody waits for a line to arrive. The mutex is only
+    taken to reconfigure the connection.
+
+    ``send`` returns once the writer has written the data and raises what
+    the write raised. While the link is down it fails fast, unless
+    ``queue_writes`` is set: then writes wait in the queue for the reconnect
+    as long as it has room.
+    """
+    read_queue_size = 1024
+    write_queue_size = 64
+
+    def __init__(self, logger: Logger, conn: Connection, queue_writes: bool = True,
+                 metrics: Metrics = disabled_metrics):
+        self.logger = logger
+        self.queue_writes = queue_writes
+        self.lock_wait = metrics.histogram('lock_wait')
         self.mutex = Lock()
         self.conn = conn
+        self.read_queue: Queue[bytes] = Queue(self.read_queue_size)
+        self.write_queue: Queue[Tuple[str, asyncio.Future]] = Queue(self.write_queue_size)
+        self.tasks: List[asyncio.Task] = []
 
     async def __aenter__(self):
+        started = time.perf_counter()
         await self.mutex.acquire()
+        self.lock_wait.observe(time.perf_counter() - started)
         return self.conn
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         self.mutex.release()
+
+    @property
+    def config(self) -> SerialConfig:
+        return self.conn.config
+
+    @property
+    def connected(self) -> asyncio.Event:
+        return self.conn.connected
+
+    async def start(self):
+        self.tasks = [
+            asyncio.create_task(self.conn.maintain()),
+            asyncio.create_task(self.reader()),
+            asyncio.create_task(self.writer()),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await asyncio.to_thread(self.conn.close)
+
+    async def recv(self) -> List[bytes]:
+        frames = [await self.read_queue.get()]
+        while not self.read_queue.empty():
+            frames.append(self.read_queue.get_nowait())
+        return frames
+
+    async def send(self, data: str) -> None:
+        if not self.conn.is_connected() and (not self.queue_writes or self.write_queue.full()):
+            raise SerialWriteError()
+        written = asyncio.get_running_loop().create_future()
+        await self.write_queue.put((data, written))
+        await written
+
+    async def reader(self):
+        while True:
+            try:
+                frames = await self.conn.read()
+            except SerialReadError:
+                # the link is down, maintain() is already reconnecting
+                await self.conn.connected.wait()
+                continue
+            except Exception as ex:
+                self.logger.error(str(ex))
+                frames = None
+
+            if not frames:
+                # nothing or only a partial frame was read, wait for more data
+                await self.conn.wait_readable()
+                continue
+            for frame in frames:
+                await self.read_queue.put(frame)
+
+    async def writer(self):
+        while True:
+            data, written = await self.write_queue.get()
+            if self.queue_writes:
+                await self.conn.connected.wait()
+            try:
+                await self.conn.send(data)
+            except Exception as ex:
+                # the sender may have given up waiting, then nobody else sees the error
+                if written.done():
+                    self.logger.error(str(ex) or repr(ex))
+                else:
+                    written.set_exception(ex)
+                continue
+            if not written.done():
+                written.set_result(None)
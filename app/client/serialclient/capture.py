@@ -0,0 +1,79 @@
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+# File layout: a header followed by one record per chunk read from the port.
+#   header: magic | version u16 | capture start, unix time f64
+#   record: monotonic ns since the start u64 | length u32 | bytes
+
+header = struct.Struct('<4sHd')
+record = struct.Struct('<QI')
+magic = b'SCAP'
+version = 1
+
+
+class CaptureWriter:
+    """Records the raw serial byte stream with monotonic timestamps.
+
+    Chunks are written as they come off the port into a large userspace
+    buffer, so recording costs a memcpy per read.
+    """
+    buffer_size = 1024 * 1024
+
+    def __init__(self, path: str):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self.file: Optional[BinaryIO] = open(path, 'wb', buffering=self.buffer_size)
+        self.started = time.monotonic_ns()
+        self.file.write(header.pack(magic, version, time.time()))
+
+    @classmethod
+    def in_directory(cls, directory: str, name: Optional[str] = None) -> 'CaptureWriter':
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        filename = f"capture-{name}-{stamp}.scap" if name else f"capture-{stamp}.scap"
+        return cls(os.path.join(directory, filename))
+
+    def write(self, data) -> None:
+        self.file.write(record.pack(time.monotonic_ns() - self.started, len(data)))
+        self.file.write(data)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CaptureReader:
+    """Memory-mapped reader of a capture, records are never loaded as a whole."""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, file_version, self.started = header.unpack_from(self.map)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError(f"{path} is not a serial capture")
+
+    def __iter__(self) -> Iterator[Tuple[float, memoryview]]:
+        """Yields ``(seconds since the start, chunk)``, a truncated last record is skipped."""
+        view = memoryview(self.map)
+        offset, end = header.size, len(self.map)
+        try:
+            while offset + record.size <= end:
+                ns, size = record.unpack_from(self.map, offset)
+                offset += record.size
+                if offset + size > end:
+                    return
+                yield ns / 1e9, view[offset:offset + size]
+                offset += size
+        finally:
+            view.release()
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,40 @@
+from app.errors import FrameDecodeError
+
+# Consistent Overhead Byte Stuffing: removes zero bytes from a frame so that
+# 0x00 can be used as an unambiguous frame delimiter on the wire.
+
+max_block = 254
+
+
+def encode(data: bytes) -> bytes:
+    data = bytes(data)
+    out = bytearray()
+    start, size = 0, len(data)
+    while True:
+        zero = data.find(b'\x00', start, start + max_block)
+        if zero == -1:
+            end = min(start + max_block, size)
+            out.append(end - start + 1)
+            out += data[start:end]
+            if end == size:
+                return bytes(out)
+            start = end
+            continue
+        out.append(zero - start + 1)
+        out += data[start:zero]
+        start = zero + 1
+
+
+def decode(data: bytes) -> bytes:
+    out = bytearray()
+    idx, size = 0, len(data)
+    while idx < size:
+        code = data[idx]
+        end = idx + code
+        if code == 0 or end > size:
+            raise FrameDecodeError("malformed COBS frame")
+        out += data[idx + 1:end]
+        idx = end
+        if code <= max_block and idx < size:
+            out.append(0)
+    return bytes(out)
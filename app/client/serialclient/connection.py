@@ -1,24 +1,71 @@
 import asyncio
 import json
+import random
+import time
+from enum import Enum
 from logging import Logger
-from typing import Optional
+from typing import Callable, List, Optional
 
 import aioserial
-import serial.tools.list_ports
+import serial
 
-from app.errors import SerialReadError, SerialWriteError
+from app.errors import FrameDecodeError, FrameOverflowError, SerialReadError, SerialWriteError
+from app.metrics import Metrics, disabled_metrics
+from . import cobs
+from .capture import CaptureWriter
 from .config import SerialConfig
+from .discovery import PortDiscovery
+from .framer import FRAME_BINARY, Framer
+
+
+class LinkState(str, Enum):
+    disconnected = 'disconnected'
+    connecting = 'connecting'
+    connected = 'connected'
 
 
 class Connection:
+    """Serial link to the boat controller.
+
+    ``maintain`` keeps the link up: while disconnected it reopens the port
+    with jittered exponential backoff. A configured port that exists is only
+    ever reopened. The port is discovered when none is configured or the
+    configured device is gone, renamed after a USB reset say. Every blocking
+    pyserial call (enumeration, open, close, config file writes) runs in a
+    worker thread. Reads and sends never wait for the link, they fail fast
+    with ``SerialReadError``/``SerialWriteError`` while it is down, callers
+    can await ``connected`` instead.
+    """
     tmp_config_filename = 'tmp/serial_config'
+    read_buffer_size = 4096
+    reconnect_backoff_min = 0.1
+    reconnect_backoff_max = 30.0
 
-    def __init__(self, logger: Logger, config: SerialConfig):
-        self.config = config
+    def __init__(self, logger: Logger, config: SerialConfig, discovery: Optional[PortDiscovery] = None,
+                 name: Optional[str] = None, capture: Optional[CaptureWriter] = None,
+                 metrics: Metrics = disabled_metrics):
         self.logger = logger
-        self.config = self.discovery_config()
-        self.serial = self.create_serial()
-        self.__buffer = b""
+        self.capture = capture
+        if name:
+            self.tmp_config_filename = f"{self.tmp_config_filename}.{name}"
+        self.frames_read = metrics.counter('frames_read')
+        self.frames_dropped = metrics.counter('frames_dropped')
+        self.decode_errors = metrics.counter('decode_errors')
+        self.reconnects = metrics.counter('reconnects')
+        self.read_time = metrics.histogram('serial_read')
+        self.write_time = metrics.histogram('serial_write')
+        self.config = self.get_tmp_config() or config
+        self.configured_port = self.config.port
+        self.discovery = discovery if discovery is not None else PortDiscovery(logger)
+        self.connecting = asyncio.Lock()
+        self.state = LinkState.disconnected
+        self.connected = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.disconnected.set()
+        self.state_listeners: List[Callable[[], None]] = []
+        # the port is opened by maintain(), see connect()
+        self.serial = aioserial.AioSerial()
+        self.framer = Framer(self.read_buffer_size)
 
     def create_serial(self, cfg=None) -> Optional[aioserial.AioSerial]:
         if cfg is None:
@@ -31,26 +78,70 @@ class Connection:
             self.logger.warning(str(ex))
             return aioserial.AioSerial()
 
-    def discovery_config(self):
-        # if file config correct use file config
-        cfg = self.get_tmp_config()
-        if cfg is not None:
-            ser = self.create_serial(cfg)
-            if ser.is_open:
-                ser.close()
-                return cfg
-
-        # else try to discover port
-        portname = self.discover_port()
-        if portname is not None:
-            self.config.port = portname
-        return self.config
-
-    def discover_port(self):
-        ports = list(serial.tools.list_ports.comports())
-        for p in ports:
-            if "Arduino" in p.description:
-                return p.name
+    def set_state(self, state: LinkState):
+        if state == self.state:
+            return
+        self.logger.info(f"serial link {state.value}")
+        self.state = state
+        if state == LinkState.connected:
+            self.disconnected.clear()
+            self.connected.set()
+        else:
+            self.connected.clear()
+            self.disconnected.set()
+        for listener in self.state_listeners:
+            listener()
+
+    def is_connected(self) -> bool:
+        return self.state == LinkState.connected
+
+    async def maintain(self):
+        """Reconnects whenever the link goes down, runs until cancelled."""
+        backoff = self.reconnect_backoff_min
+        while True:
+            await self.disconnected.wait()
+            if await self.connect():
+                backoff = self.reconnect_backoff_min
+                continue
+            # the jitter keeps several connectors from retrying in lockstep
+            delay = random.uniform(backoff / 2, backoff)
+            self.logger.warning(f"serial not reachable, retrying in {delay:.1f} sec")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.reconnect_backoff_max)
+
+    async def connect(self) -> bool:
+        """Discovers the port off the event loop and opens it."""
+        async with self.connecting:
+            if self.is_connected():
+                return True
+            self.set_state(LinkState.connecting)
+            try:
+                if self.configured_port and await asyncio.to_thread(self.discovery.present, self.configured_port):
+                    # a configured port that exists but fails to open is never swapped for another one
+                    self.config.port = self.configured_port
+                else:
+                    port = await asyncio.to_thread(self.discovery.discover, self.config)
+                    if port is not None and port != self.config.port:
+                        self.logger.info(f"discovered serial port {port}")
+                        self.config.port = port
+                self.framer.reset()
+                await asyncio.to_thread(self.restart_serial)
+                if self.__check_serial():
+                    await asyncio.to_thread(self.discovery.remember, self.config.port)
+            except Exception as ex:
+                self.logger.error(str(ex))
+            self.set_state(LinkState.connected if self.__check_serial() else LinkState.disconnected)
+            return self.is_connected()
+
+    async def lost(self, ser: aioserial.AioSerial, err: Exception):
+        """Marks the link down after a failed read or write on ``ser``."""
+        if not self.is_connected() or ser is not self.serial:
+            # already reconnecting, or a late failure of a replaced port
+            return
+        self.logger.error(f"serial link lost: {err}")
+        self.set_state(LinkState.disconnected)
+        # closing a tty may wait for its output to drain
+        await asyncio.to_thread(ser.close)
 
     def get_tmp_config(self) -> Optional[SerialConfig]:
         try:
@@ -68,6 +159,7 @@ class Connection:
             pass
 
     def restart_serial(self):
+        self.reconnects.inc()
         if self.serial.is_open:
             self.serial.close()
         self.serial = self.create_serial()
@@ -78,32 +170,89 @@ class Connection:
         except serial.SerialException as ex:
             self.logger.info(str(ex))
 
-    async def read(self) -> Optional[str]:
-        await self.validate_and_fix_config()
-        if not self.__check_serial():
+    async def read(self) -> List[bytes]:
+        if not self.is_connected():
             raise SerialReadError()
 
-        data: bytes = await self.serial.readline_async()
-        if data:
-            is_newline = data.find(b'\n')
-            if is_newline != -1:
-                self.append_buffer(data[:is_newline])
-                return self.pop_buffer().decode('UTF-8')
+        ser = self.serial
+        try:
+            # at least one byte so a blocking port waits for data instead of spinning
+            buffer = self.framer.writable(max(1, ser.in_waiting))
+        except FrameOverflowError as err:
+            self.frames_dropped.inc()
+            self.logger.warning(str(err))
+            return []
+        except (serial.SerialException, OSError) as ex:
+            await self.lost(ser, ex)
+            raise SerialReadError() from ex
 
-            self.append_buffer(data)
+        started = time.perf_counter()
+        try:
+            size = await ser.readinto_async(buffer)
+        except (serial.SerialException, OSError) as ex:
+            await self.lost(ser, ex)
+            raise SerialReadError() from ex
+        self.read_time.observe(time.perf_counter() - started)
+        if not size:
+            return []
+        self.framer.commit(size)
+        if self.capture is not None:
+            self.capture.write(buffer[:size])
+        frames = self.decode_frames()
+        self.frames_read.inc(len(frames))
+        return frames
+
+    def decode_frames(self) -> List[bytes]:
+        frames = []
+        for kind, frame in self.framer.frames():
+            if kind == FRAME_BINARY:
+                try:
+                    frames.append(cobs.decode(frame))
+                except FrameDecodeError as err:
+                    self.decode_errors.inc()
+                    self.logger.warning(str(err))
+            else:
+                frames.append(bytes(frame))
+        return frames
+
+    async def wait_readable(self, timeout: float = 1.0) -> None:
+        """Waits until the port has data to read, falls back to a sleep where
+        the port has no pollable file descriptor."""
+        loop = asyncio.get_running_loop()
+        readable = loop.create_future()
+        try:
+            fd = self.serial.fileno()
+            loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        except Exception:
+            await asyncio.sleep(timeout)
+            return
+
+        try:
+            await asyncio.wait_for(readable, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(fd)
 
     async def send(self, data: str) -> None:
-        data = data.strip()
-        await self.validate_and_fix_config()
-        if not self.__check_serial():
+        if not self.is_connected():
             raise SerialWriteError()
-        await self.serial.writelines_async([data.encode('UTF-8')])
+        # one message per line, the controller frames on the terminator
+        data = data.strip() + '\n'
+        ser = self.serial
+        started = time.perf_counter()
+        try:
+            await ser.writelines_async([data.encode('UTF-8')])
+        except (serial.SerialException, OSError) as ex:
+            await self.lost(ser, ex)
+            raise SerialWriteError() from ex
+        self.write_time.observe(time.perf_counter() - started)
 
-    async def validate_and_fix_config(self):
-        if not self.__check_serial():
-            self.logger.warning("Serial not reachable, sleeping for 5 sec")
-            await asyncio.sleep(5)
-            self.update_config(self.discovery_config())
+    def close(self):
+        """Closes the port and the capture, blocks."""
+        if self.capture is not None:
+            self.capture.close()
+        self.serial.close()
 
     def check_serial(self) -> bool:
         return self.__check_serial(self.serial)
@@ -114,15 +263,14 @@ class Connection:
 
         return ser.is_open
 
-    def update_config(self, new_cfg: SerialConfig):
-        self.config = new_cfg
-        self.save_tmp_config()
-        self.restart_serial()
-
-    def pop_buffer(self):
-        result = self.__buffer[:]
-        self.__buffer = b""
-        return result
-
-    def append_buffer(self, data: bytes):
-        self.__buffer += data
+    async def update_config(self, new_cfg: SerialConfig):
+        async with self.connecting:
+            self.set_state(LinkState.connecting)
+            self.config = new_cfg
+            self.configured_port = new_cfg.port
+            self.framer.reset()
+            await asyncio.to_thread(self.save_tmp_config)
+            await asyncio.to_thread(self.restart_serial)
+            if self.__check_serial():
+                await asyncio.to_thread(self.discovery.remember, self.config.port)
+            self.set_state(LinkState.connected if self.__check_serial() else LinkState.disconnected)
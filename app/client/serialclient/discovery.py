@@ -0,0 +1,153 @@
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import Logger
+from typing import List, Optional, Tuple
+
+import serial
+import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+from .config import SerialConfig
+
+Identity = Tuple[int, int, Optional[str]]
+
+
+class PortDiscovery:
+    """Finds the serial port of the boat controller.
+
+    The last port that worked is cached by its USB identity (VID/PID/serial
+    number), so after a reboot it is found again without probing anything,
+    even if the kernel hands out another device name. Otherwise the ports
+    looking like the controller, by ``vid``/``pid`` and a ``match`` in their
+    description, are probed concurrently: a port answering within
+    ``probe_timeout`` wins, then the best ranked port that at least opened.
+    Ports that do not match are never opened, so discovery never touches a
+    modem or the port of another device. A probe only listens, it writes
+    nothing and leaves DTR/RTS low so an Arduino is not reset by it.
+
+    Only used when no port is configured or the configured one is missing.
+    All methods block, run them in a thread.
+    """
+    cache_filename = 'tmp/serial_port'
+
+    def __init__(self, logger: Logger, match: str = 'Arduino', probe_timeout: float = 0.5,
+                 cache_filename: Optional[str] = None, vid: Optional[int] = None, pid: Optional[int] = None):
+        self.logger = logger
+        self.match = match
+        self.probe_timeout = probe_timeout
+        self.vid = vid
+        self.pid = pid
+        if cache_filename is not None:
+            self.cache_filename = cache_filename
+
+    def discover(self, cfg: SerialConfig) -> Optional[str]:
+        ports = list(serial.tools.list_ports.comports())
+
+        cached = self.load_cache()
+        if cached is not None:
+            for p in ports:
+                if self.identity(p) == cached and self.matches(p):
+                    return p.device
+
+        candidates = self.candidates(ports, cfg)
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            # nothing to choose from, opening is enough
+            return candidates[0] if self.probe(candidates[0], cfg, 0) is not None else None
+        return self.probe_all(candidates, cfg)
+
+    def candidates(self, ports: List[ListPortInfo], cfg: SerialConfig) -> List[str]:
+        """Matching ports, the one found last time first."""
+        if not self.match and self.vid is None and self.pid is None:
+            self.logger.warning("no discovery match or VID/PID configured, not probing any port")
+            return []
+        result = [p.device for p in ports if self.matches(p)]
+        if cfg.port in result:
+            result.remove(cfg.port)
+            result.insert(0, cfg.port)
+        return result
+
+    def matches(self, port: ListPortInfo) -> bool:
+        return ((self.vid is None or port.vid == self.vid)
+                and (self.pid is None or port.pid == self.pid)
+                and (not self.match or self.match in (port.description or '')))
+
+    def probe_all(self, candidates: List[str], cfg: SerialConfig) -> Optional[str]:
+        opened = set()
+        executor = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix='port-probe')
+        try:
+            pending = {executor.submit(self.probe, device, cfg, self.probe_timeout): device
+                       for device in candidates}
+            while pending:
+                done, _ = wait(pending, timeout=self.probe_timeout + 1, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    device = pending.pop(future)
+                    answered = future.result()
+                    if answered:
+                        return device
+                    if answered is not None:
+                        opened.add(device)
+        finally:
+            # probes still running close their ports on their own
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for device in candidates:
+            if device in opened:
+                return device
+        return None
+
+    def probe(self, device: str, cfg: SerialConfig, timeout: float) -> Optional[bool]:
+        """True if the port sent something, False if it only opened, None if it did not open."""
+        try:
+            ser = serial.Serial(baudrate=cfg.baudrate, bytesize=cfg.bytesize, parity=cfg.parity,
+                                stopbits=cfg.stopbits, timeout=timeout)
+            # raising DTR resets most Arduino boards, keep the lines low while listening
+            ser.dtr = False
+            ser.rts = False
+            ser.port = device
+            with ser:
+                return bool(timeout) and bool(ser.read(1))
+        except (serial.SerialException, OSError, ValueError) as ex:
+            self.logger.debug(f"probe {device}: {ex}")
+            return None
+
+    @staticmethod
+    def present(device: str) -> bool:
+        """True if ``device`` exists, symlinks and ptys are not always listed."""
+        return os.path.exists(device) or any(p.device == device for p in serial.tools.list_ports.comports())
+
+    def remember(self, device: str) -> None:
+        """Caches the USB identity of a port that worked."""
+        for p in serial.tools.list_ports.comports():
+            if p.device == device and p.vid is not None:
+                self.save_cache(self.identity(p))
+                return
+
+    @staticmethod
+    def identity(port: ListPortInfo) -> Optional[Identity]:
+        if port.vid is None:
+            return None
+        return port.vid, port.pid, port.serial_number
+
+    def load_cache(self) -> Optional[Identity]:
+        try:
+            with open(self.cache_filename) as f:
+                data = json.load(f)
+            return data['vid'], data['pid'], data['serial_number']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save_cache(self, identity: Identity) -> None:
+        vid, pid, serial_number = identity
+        try:
+            dirname = os.path.dirname(self.cache_filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            with open(self.cache_filename, 'w') as f:
+                json.dump({'vid': vid, 'pid': pid, 'serial_number': serial_number}, f)
+        except OSError as ex:
+            self.logger.warning(f"failed to cache serial port: {ex}")
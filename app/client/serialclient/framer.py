@@ -0,0 +1,120 @@
+from typing import Iterator, Tuple
+
+from app.errors import FrameOverflowError
+
+FRAME_TEXT = 0
+FRAME_BINARY = 1
+
+
+class Framer:
+    """Splits the serial byte stream into frames.
+
+    Text frames are newline terminated JSON lines. Binary frames are COBS
+    encoded and enclosed in zero bytes (``0x00 <cobs> 0x00``), a zero byte
+    never occurs in a text line so the format is detected per frame.
+
+    Incoming bytes are read straight into a preallocated buffer, complete
+    frames are yielded as memoryview slices of that buffer and the partial
+    tail is moved to the front of the buffer without reallocating.
+    """
+    max_binary_frame = 255
+
+    def __init__(self, size: int = 4096):
+        self.__buffer = bytearray(size)
+        self.__view = memoryview(self.__buffer)
+        self.__start = 0
+        self.__end = 0
+        self.__binary = False
+        self.__discard = False
+
+    @property
+    def pending(self) -> int:
+        return self.__end - self.__start
+
+    def writable(self, size: int) -> memoryview:
+        """Returns a view of at most ``size`` free bytes to read into."""
+        if self.__start == self.__end:
+            self.__start = self.__end = 0
+        elif self.__end == len(self.__buffer):
+            self.compact()
+        if self.__end == len(self.__buffer):
+            # a frame longer than the buffer, drop it and resync on the next delimiter
+            self.__start = self.__end = 0
+            self.__binary = False
+            self.__discard = True
+            raise FrameOverflowError(f"frame exceeds {len(self.__buffer)} bytes")
+        return self.__view[self.__end:min(self.__end + size, len(self.__buffer))]
+
+    def commit(self, size: int) -> None:
+        self.__end += size
+
+    def feed(self, data: bytes) -> int:
+        """Copies as much of ``data`` as fits, returns the number of bytes taken."""
+        view = self.writable(len(data))
+        size = len(view)
+        view[:] = data[:size]
+        self.commit(size)
+        return size
+
+    def frames(self) -> Iterator[Tuple[int, memoryview]]:
+        """Yields ``(kind, frame)`` pairs, a frame is only valid until the next read."""
+        buffer, end = self.__buffer, self.__end
+        zero = -1
+        while self.__start < end:
+            start = self.__start
+            if zero < start:
+                zero = buffer.find(0, start, end)
+                if zero == -1:
+                    zero = end
+
+            if self.__binary:
+                if zero - start > self.max_binary_frame:
+                    # lost the closing delimiter, fall back to text lines
+                    self.__binary = False
+                    continue
+                if zero == end:
+                    return
+                self.__start = zero + 1
+                if zero == start:
+                    # back to back delimiters, this one opens the next frame
+                    continue
+                self.__binary = False
+                if self.__discard:
+                    self.__discard = False
+                    continue
+                yield FRAME_BINARY, self.__view[start:zero]
+                continue
+
+            idx = buffer.find(b'\n', start, zero)
+            if idx == -1:
+                if zero == end:
+                    return
+                # an opening zero delimiter, anything before it is an unterminated line
+                self.__start = zero + 1
+                self.__binary = True
+                self.__discard = False
+                continue
+
+            self.__start = idx + 1
+            if self.__discard:
+                self.__discard = False
+                continue
+            if idx > start and buffer[idx - 1] == 0x0D:  # \r\n
+                idx -= 1
+            if idx > start:
+                yield FRAME_TEXT, self.__view[start:idx]
+
+    def compact(self) -> None:
+        if self.__start == 0:
+            return
+        pending = self.pending
+        if pending:
+            # the source overlaps the destination, copy the (short) tail first
+            self.__buffer[:pending] = bytes(self.__view[self.__start:self.__end])
+        self.__start = 0
+        self.__end = pending
+
+    def reset(self) -> None:
+        self.__start = self.__end = 0
+        self.__binary = False
+        self.__discard = False
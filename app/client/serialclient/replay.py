@@ -0,0 +1,80 @@
+import asyncio
+import time
+from logging import Logger
+from typing import Iterator, List, Optional, Tuple
+
+from app.errors import FrameOverflowError
+from app.metrics import Metrics, disabled_metrics
+from .capture import CaptureReader
+from .config import SerialConfig
+from .connection import Connection, LinkState
+
+
+class ReplayConnection(Connection):
+    """Feeds a serial capture through the normal framing/parse/publish path.
+
+    Chunks are replayed with their recorded spacing divided by ``speed``, a
+    speed of 0 replays as fast as the pipeline takes them. Writes to the
+    port are dropped. ``finished`` is set once the last chunk is read.
+    """
+
+    def __init__(self, logger: Logger, config: SerialConfig, path: str, speed: float = 1.0,
+                 metrics: Metrics = disabled_metrics):
+        super().__init__(logger, config, metrics=metrics)
+        self.path = path
+        self.speed = speed
+        self.finished = asyncio.Event()
+        self.reader: Optional[CaptureReader] = None
+        self.records: Optional[Iterator[Tuple[float, memoryview]]] = None
+        self.replay_started = 0.0
+
+    async def maintain(self):
+        self.reader = CaptureReader(self.path)
+        self.records = iter(self.reader)
+        self.replay_started = time.monotonic()
+        self.logger.info(f"replaying {self.path} at {self.speed or 'max'} speed")
+        self.set_state(LinkState.connected)
+        try:
+            await self.finished.wait()
+        finally:
+            self.records = None
+            self.reader.close()
+
+    async def read(self) -> List[bytes]:
+        if self.records is None or self.finished.is_set():
+            return []
+        item = next(self.records, None)
+        if item is None:
+            self.logger.info(f"replay of {self.path} finished")
+            self.finished.set()
+            return []
+        offset, chunk = item
+        if self.speed:
+            delay = self.replay_started + offset / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        frames = []
+        data = bytes(chunk)
+        del item, chunk
+        position = 0
+        while position < len(data):
+            try:
+                position += self.framer.feed(data[position:])
+            except FrameOverflowError as err:
+                self.frames_dropped.inc()
+                self.logger.warning(str(err))
+                continue
+            frames.extend(self.decode_frames())
+        self.frames_read.inc(len(frames))
+        return frames
+
+    async def wait_readable(self, timeout: float = 1.0) -> None:
+        if self.finished.is_set():
+            await asyncio.sleep(timeout)
+
+    async def send(self, data: str) -> None:
+        self.logger.debug(f"replay, dropping write {data.strip()}")
+
+    async def update_config(self, new_cfg: SerialConfig):
+        self.config = new_cfg
@@ -1,10 +1,35 @@
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 import serial
-from pydantic import RedisDsn
+from pydantic import BaseModel, Field, RedisDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class DeviceConfig(BaseModel):
+    """One named serial link of ``serial_devices``.
+
+    ``fields`` lists the telemetry fields the device sends when it is not a
+    full controller (an MPPT or a GPS link), only those are required in its
+    frames and published. The stages (aggregation, archive, snapshot, derived)
+    see the missing fields as 0.
+    """
+    port: str = ''
+    baudrate: Optional[int] = 115200
+    bytesize: Optional[int] = 8
+    parity: Optional[str] = serial.PARITY_NONE
+    stopbits: Optional[int] = 1
+    timeout: Optional[int] = 0
+    match: Optional[str] = None
+    vid: Optional[int] = None
+    pid: Optional[int] = None
+    telemetry_channel: Optional[str] = None
+    telemetry_stream: Optional[str] = None
+    fields: Optional[List[str]] = Field(None, min_length=1)
+    # a worker process publishes telemetry only: its queue does not show in
+    # the status updates and the derived reset channel does not reach it
+    worker: bool = False
+
+
 class Config(BaseSettings):
     model_config = SettingsConfigDict(env_file='.env')
 
@@ -12,12 +37,96 @@ class Config(BaseSettings):
     redis_config_channel: str
     redis_config_apply_channel: str
     redis_status_update_channel: str
+    status_update_interval: float = 5.0
     redis_telemetry_channel: str
     redis_log_channel: str
+    log_queue_size: int = 10000
+    log_batch_size: int = 100
     redis_land_queue_channel: str = 'land_queue_channel'
+    redis_land_status_channel: str = 'land_status_channel'
+    land_queue_size: int = 256
+    land_ack_enabled: bool = False
+    land_window_size: int = 8
+    land_ack_timeout: float = 1.0
+    land_max_retries: int = 3
+    telemetry_output: Literal['pubsub', 'stream'] = 'pubsub'
+    redis_telemetry_stream: str = 'telemetry_stream'
+    telemetry_stream_maxlen: int = 100000
+    telemetry_batch_size: int = 32
+    telemetry_batch_interval: float = 0.02
+    telemetry_fields: Optional[List[str]] = Field(None, min_length=1)
+    telemetry_queue_size: int = 10000
+    telemetry_queue_policy: Literal['drop_oldest', 'drop_newest', 'decimate'] = 'drop_oldest'
+    telemetry_queue_high_watermark: float = Field(0.8, gt=0, le=1)
+    telemetry_decimate_factor: int = Field(4, ge=1)
+    telemetry_delta_enabled: bool = False
+    telemetry_keyframe_interval: float = 5.0
+    telemetry_deadbands: Dict[str, float] = {}
+    telemetry_outage_buffer_enabled: bool = True
+    telemetry_outage_buffer_path: str = 'tmp/telemetry_outage'
+    telemetry_outage_buffer_size: int = 64 * 1024 * 1024
+    telemetry_outage_buffer_policy: Literal['drop_oldest', 'drop_newest'] = 'drop_oldest'
+    telemetry_outage_replay_batch_size: int = 512
+    telemetry_outage_retry_interval: float = 1.0
+    telemetry_aggregation_enabled: bool = False
+    telemetry_aggregation_windows: List[int] = [1, 10, 60]
+    telemetry_aggregation_capacity: int = 4096
+    redis_telemetry_summary_channel: str = 'telemetry_summary'
+    telemetry_derived_enabled: bool = False
+    redis_telemetry_derived_channel: str = 'telemetry_derived'
+    redis_derived_reset_channel: str = 'telemetry_derived_reset'
+    derived_speed_tau: float = 2.0
+    derived_max_gap: float = 10.0
+    telemetry_snapshot_enabled: bool = False
+    telemetry_snapshot_path: str = '/dev/shm/solar_connector_telemetry'
+    telemetry_archive_enabled: bool = False
+    telemetry_archive_path: str = 'tmp/telemetry_archive'
+    telemetry_archive_chunk_rows: int = 65536
+    telemetry_archive_flush_interval: float = 1.0
+    metrics_enabled: bool = False
+    metrics_interval: float = 5.0
+    redis_metrics_key: str = 'connector_metrics'
+    redis_metrics_channel: str = 'connector_metrics'
+    metrics_host: str = '127.0.0.1'
+    metrics_port: Optional[int] = None
+    diagnostics_enabled: bool = True
+    redis_diagnostics_channel: str = 'connector_diagnostics'
+    redis_diagnostics_result_channel: str = 'connector_diagnostics_result'
+    diagnostics_path: str = 'tmp/diagnostics'
+    diagnostics_max_duration: float = 120.0
     serial_port: str
     serial_baudrate: Optional[int] = 115200
     serial_bytesize: Optional[int] = 8
     serial_parity: Optional[str] = serial.PARITY_NONE
     serial_stopbits: Optional[int] = 1
     serial_timeout: Optional[int] = None
+    serial_discovery_match: str = 'Arduino'
+    serial_discovery_vid: Optional[int] = None
+    serial_discovery_pid: Optional[int] = None
+    serial_probe_timeout: float = 0.5
+    serial_port_cache: str = 'tmp/serial_port'
+    serial_queue_writes: bool = True
+    serial_capture_path: Optional[str] = None
+    serial_replay_path: Optional[str] = None
+    serial_replay_speed: float = 1.0
+    serial_devices: Dict[str, DeviceConfig] = {}
+    serial_primary_device: Optional[str] = None
+
+    def device_config(self, name: str, device: DeviceConfig) -> 'Config':
+        """Copy of the config with the channels, stream and files of device ``name``."""
+        return self.model_copy(update={
+            'redis_telemetry_channel': device.telemetry_channel or f"{self.redis_telemetry_channel}:{name}",
+            'redis_telemetry_stream': device.telemetry_stream or f"{self.redis_telemetry_stream}:{name}",
+            'redis_telemetry_summary_channel': f"{self.redis_telemetry_summary_channel}:{name}",
+            'redis_telemetry_derived_channel': f"{self.redis_telemetry_derived_channel}:{name}",
+            'telemetry_snapshot_path': f"{self.telemetry_snapshot_path}.{name}",
+            'telemetry_archive_path': f"{self.telemetry_archive_path}.{name}",
+            'telemetry_outage_buffer_path': f"{self.telemetry_outage_buffer_path}.{name}",
+            'serial_port_cache': f"{self.serial_port_cache}.{name}",
+            'serial_discovery_match': device.match or '',
+            'serial_discovery_vid': device.vid,
+            'serial_discovery_pid': device.pid,
+            'telemetry_fields': device.fields,
+            # a capture holds the stream of a single port
+            'serial_replay_path': None,
+        })
@@ -0,0 +1,98 @@
+import json
+import time
+from datetime import datetime
+from functools import partial
+from logging import Logger
+from operator import attrgetter
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from redis.asyncio import Redis
+
+from app.config.config import Config
+from app.controller.telemetrycontroller.models import Telemetry, telemetry_fields
+from app.scheduler import Job, Scheduler
+
+
+class AggregationController:
+    """Rolling-window telemetry summaries.
+
+    Samples are appended to a ring buffer with one column per telemetry field.
+    Every window length (1 s, 10 s, 60 s by default) min/max/mean/last over the
+    samples of that window are computed in one pass over the buffer and
+    published to ``<redis_telemetry_summary_channel>:<window>s`` by a
+    scheduler job per window.
+
+    The buffer holds ``telemetry_aggregation_capacity`` samples. A window
+    longer than that at the actual sample rate is summarized over the samples
+    that fit, which is logged once per window.
+    """
+
+    def __init__(self, logger: Logger, redis: Redis, scheduler: Scheduler, config: Config):
+        self.logger = logger
+        self.redis = redis
+        self.scheduler = scheduler
+        self.channel = config.redis_telemetry_summary_channel
+        self.windows = sorted(set(config.telemetry_aggregation_windows))
+        self.capacity = config.telemetry_aggregation_capacity
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.values = np.zeros((self.capacity, len(telemetry_fields)), dtype=np.float64)
+        self.get_values = attrgetter(*telemetry_fields)
+        self.count = 0
+        self.truncated: Set[int] = set()
+        self.jobs: List[Job] = []
+
+    async def start(self):
+        self.jobs = [
+            self.scheduler.every(f"{self.channel}:{window}s", window, partial(self.publish_summaries, [window]))
+            for window in self.windows
+        ]
+
+    async def stop(self):
+        for job in self.jobs:
+            self.scheduler.cancel(job)
+        self.jobs = []
+
+    def process_telemetry(self, telemetry: Telemetry):
+        idx = self.count % self.capacity
+        self.timestamps[idx] = time.monotonic()
+        self.values[idx] = self.get_values(telemetry)
+        self.count += 1
+
+    async def publish_summaries(self, windows: List[int]):
+        now = time.monotonic()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for window in windows:
+                summary = self.summarize(window, now)
+                if summary is not None:
+                    pipe.publish(f"{self.channel}:{window}s", json.dumps(summary))
+            await pipe.execute()
+
+    def summarize(self, window: int, now: float) -> Optional[Dict]:
+        size = min(self.count, self.capacity)
+        if size == 0:
+            return None
+        if self.count > self.capacity and window not in self.truncated:
+            oldest = self.timestamps[self.count % self.capacity]
+            if oldest > now - window:
+                self.truncated.add(window)
+                self.logger.warning(f"{window}s telemetry window does not fit in {self.capacity} samples, "
+                                    f"summaries cover the last {now - oldest:.1f}s only")
+        selected = self.values[:size][self.timestamps[:size] >= now - window]
+        if len(selected) == 0:
+            return None
+
+        last = self.values[(self.count - 1) % self.capacity]
+        return {
+            'created_at': datetime.now().isoformat(),
+            'window': window,
+            'count': len(selected),
+            'min': self.by_field(selected.min(axis=0)),
+            'max': self.by_field(selected.max(axis=0)),
+            'mean': self.by_field(selected.mean(axis=0)),
+            'last': self.by_field(last),
+        }
+
+    @staticmethod
+    def by_field(values: np.ndarray) -> Dict[str, float]:
+        return dict(zip(telemetry_fields, values.tolist()))
@@ -0,0 +1,60 @@
+import asyncio
+from logging import Logger
+from operator import attrgetter
+from typing import List, Optional
+
+from app.config.config import Config
+from app.controller.telemetrycontroller.archive import ArchiveWriter
+from app.controller.telemetrycontroller.models import Telemetry, telemetry_fields
+from app.scheduler import Job, Scheduler
+
+
+class ArchiveController:
+    """Writes every telemetry sample to the columnar archive in ``telemetry_archive_path``.
+
+    A telemetry stage: samples are collected as plain tuples and a scheduler
+    job hands them to the ``ArchiveWriter`` every
+    ``telemetry_archive_flush_interval`` seconds, in a thread, so the disk
+    never stalls the event loop. Read the archive with ``ArchiveReader``.
+    """
+
+    def __init__(self, logger: Logger, scheduler: Scheduler, config: Config):
+        self.logger = logger
+        self.scheduler = scheduler
+        self.path = config.telemetry_archive_path
+        self.chunk_rows = config.telemetry_archive_chunk_rows
+        self.flush_interval = config.telemetry_archive_flush_interval
+        self.get_values = attrgetter(*telemetry_fields)
+        self.pending: List[tuple] = []
+        self.writer: Optional[ArchiveWriter] = None
+        # one writer thread at a time, a flush may still run when stop() comes
+        self.write_lock = asyncio.Lock()
+        self.flush_job: Optional[Job] = None
+
+    async def start(self):
+        self.writer = await asyncio.to_thread(ArchiveWriter, self.path, self.chunk_rows)
+        self.flush_job = self.scheduler.every(f"archive:{self.path}", self.flush_interval, self.flush)
+        self.logger.info(f"archiving telemetry to {self.path}")
+
+    async def stop(self):
+        if self.flush_job is not None:
+            self.scheduler.cancel(self.flush_job)
+            self.flush_job = None
+        if self.writer is not None:
+            await self.flush()
+            async with self.write_lock:
+                await asyncio.to_thread(self.writer.close)
+                self.writer = None
+
+    def process_telemetry(self, telemetry: Telemetry):
+        self.pending.append((telemetry.created_at.timestamp(),) + self.get_values(telemetry))
+
+    async def flush(self):
+        async with self.write_lock:
+            if not self.pending or self.writer is None:
+                return
+            rows, self.pending = self.pending, []
+            try:
+                await asyncio.to_thread(self.writer.write, rows)
+            except OSError as ex:
+                self.logger.error(f"failed to archive {len(rows)} telemetry samples: {ex}")
@@ -1,5 +1,6 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from logging import Logger
+from typing import Optional
 
 from redis.asyncio import Redis
 
@@ -7,30 +8,35 @@ from app.client import ConnectionProvider
 from app.client.serialclient import SerialConfig
 from app.config.config import Config
 from app.payloads import ConfigUpdated
+from app.scheduler import Job, Scheduler
 
 
 class ConfigController:
-    config_propagate_interval = timedelta(seconds=30)
+    config_propagate_interval = 30.0
 
     def __init__(self,
                  logger: Logger,
                  connection_provider: ConnectionProvider,
                  redis: Redis,
+                 scheduler: Scheduler,
                  config: Config,
                  ):
         self.logger = logger
         self.redis = redis
+        self.scheduler = scheduler
         self.config_apply_channel = config.redis_config_apply_channel
         self.pubsub = redis.pubsub()
         self.conn_provider = connection_provider
-        self.last_config_propagate = datetime.now() - self.config_propagate_interval
+        self.propagate_job: Optional[Job] = None
 
-    async def process_config_propagate(self):
-        if datetime.now() - self.last_config_propagate < self.config_propagate_interval:
-            return
+    async def start(self):
+        self.propagate_job = self.scheduler.every(
+            "config_propagate", self.config_propagate_interval, self.propagate_config, delay=0)
 
-        self.last_config_propagate = datetime.now()
-        await self.propagate_config()
+    async def stop(self):
+        if self.propagate_job is not None:
+            self.scheduler.cancel(self.propagate_job)
+            self.propagate_job = None
 
     async def propagate_config(self):
         cfg = await self.get_config_update_payload()
@@ -38,10 +44,8 @@ class ConfigController:
 
     async def update_config(self, config: SerialConfig):
         async with self.conn_provider as conn:
-            conn.update_config(config)
+            await conn.update_config(config)
         await self.propagate_config()
 
     async def get_config_update_payload(self) -> ConfigUpdated:
-        async with self.conn_provider as conn:
-            config_update = ConfigUpdated(timestamp=datetime.now(), config=conn.config)
-            return config_update
+        return ConfigUpdated(timestamp=datetime.now(), config=self.conn_provider.config)
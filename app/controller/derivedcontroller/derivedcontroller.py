@@ -0,0 +1,139 @@
+import asyncio
+import json
+import math
+from collections import deque
+from logging import Logger
+from typing import Deque, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from app.config.config import Config
+from app.controller.telemetrycontroller.models import Telemetry
+
+earth_radius = 6371008.8  # mean radius, m
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * earth_radius * math.asin(math.sqrt(a))
+
+
+def bearing(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Initial course from the first point to the second, degrees from north."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_lambda = math.radians(lng2 - lng1)
+    y = math.sin(d_lambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(d_lambda)
+    return math.degrees(math.atan2(y, x)) % 360
+
+
+class DerivedController:
+    """Derived telemetry, computed once at the source.
+
+    A telemetry stage keeping O(1) running state: distance travelled
+    (haversine), ground speed (smoothed with a ``derived_speed_tau`` time
+    constant), heading, and energy in (MPPT) and out (controller) as
+    trapezoidal integrals of power. Every sample yields one message on
+    ``redis_telemetry_derived_channel``. Integration does not bridge gaps
+    longer than ``derived_max_gap`` seconds. ``reset`` zeroes the totals,
+    e.g. at race start.
+    """
+    # heading is only updated over segments at least this long, GPS jitter
+    # of a boat at rest would spin it around otherwise
+    min_heading_distance = 0.5
+    # messages kept while Redis is unreachable, the oldest are dropped first
+    max_pending = 10000
+    retry_interval = 1.0
+
+    def __init__(self, logger: Logger, redis: Redis, config: Config):
+        self.logger = logger
+        self.redis = redis
+        self.channel = config.redis_telemetry_derived_channel
+        self.speed_tau = config.derived_speed_tau
+        self.max_gap = config.derived_max_gap
+        self.pending: Deque[str] = deque(maxlen=self.max_pending)
+        self.pending_ready = asyncio.Event()
+        self.publish_task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        self.started_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.last_position: Optional[Tuple[float, float]] = None
+        self.last_power: Tuple[float, float] = (0.0, 0.0)
+        self.distance = 0.0
+        self.speed = 0.0
+        self.heading: Optional[float] = None
+        self.energy_in = 0.0
+        self.energy_out = 0.0
+
+    async def start(self):
+        self.publish_task = asyncio.create_task(self.publisher())
+
+    async def stop(self):
+        if self.publish_task is not None:
+            self.publish_task.cancel()
+            await asyncio.gather(self.publish_task, return_exceptions=True)
+            self.publish_task = None
+
+    def process_telemetry(self, telemetry: Telemetry):
+        now = telemetry.created_at.timestamp()
+        position = (telemetry.position_lat, telemetry.position_lng)
+        power = (telemetry.MPPT_watts, telemetry.controller_watts)
+        if self.started_at is None:
+            self.started_at = now
+
+        dt = now - self.last_at if self.last_at is not None else 0.0
+        if 0 < dt <= self.max_gap:
+            self.energy_in += (self.last_power[0] + power[0]) / 2 * dt / 3600
+            self.energy_out += (self.last_power[1] + power[1]) / 2 * dt / 3600
+            if self.last_position is not None and self.has_fix(position):
+                segment = haversine(*self.last_position, *position)
+                self.distance += segment
+                alpha = 1 - math.exp(-dt / self.speed_tau)
+                self.speed += alpha * (segment / dt - self.speed)
+                if segment >= self.min_heading_distance:
+                    self.heading = bearing(*self.last_position, *position)
+
+        self.last_at = now
+        self.last_power = power
+        if self.has_fix(position):
+            self.last_position = position
+
+        self.pending.append(json.dumps({
+            'created_at': telemetry.created_at.isoformat(),
+            'elapsed_s': now - self.started_at,
+            'distance_m': self.distance,
+            'speed_mps': self.speed,
+            'heading_deg': self.heading,
+            'energy_in_wh': self.energy_in,
+            'energy_out_wh': self.energy_out,
+        }))
+        self.pending_ready.set()
+
+    @staticmethod
+    def has_fix(position: Tuple[float, float]) -> bool:
+        # the controller reports 0, 0 until the GPS has a fix
+        return position != (0.0, 0.0)
+
+    async def publisher(self):
+        while True:
+            await self.pending_ready.wait()
+            self.pending_ready.clear()
+            batch, self.pending = self.pending, deque(maxlen=self.max_pending)
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for payload in batch:
+                        pipe.publish(self.channel, payload)
+                    await pipe.execute()
+            except Exception as ex:
+                self.logger.error(f"failed to publish {len(batch)} derived telemetry messages: {ex}")
+                # back in front of what came in meanwhile, beyond max_pending the oldest go
+                batch.extend(self.pending)
+                self.pending = batch
+                self.pending_ready.set()
+                await asyncio.sleep(self.retry_interval)
@@ -0,0 +1,201 @@
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+from datetime import datetime
+from logging import Logger
+from typing import Dict, List, Optional
+
+from redis.asyncio import Redis
+
+from app.config.config import Config
+from app.controller.diagnosticscontroller.sampler import SamplingProfiler
+from app.metrics import Metrics
+from app.payloads import DiagnosticsCommand
+
+asyncio_logger = logging.getLogger('asyncio')
+
+
+class SlowCallbackHandler(logging.Handler):
+    """Forwards the warnings of the asyncio debug mode to the connector log."""
+
+    def __init__(self, controller: 'DiagnosticsController'):
+        super().__init__(logging.WARNING)
+        self.controller = controller
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        if message.startswith('Executing'):
+            self.controller.slow_callbacks.inc()
+        self.controller.logger.warning(message)
+
+
+class DiagnosticsController:
+    """Runtime diagnostics, driven by ``DiagnosticsCommand`` messages.
+
+    * ``slow_callbacks`` switches the asyncio debug mode on or off; every
+      callback or task step running longer than ``threshold`` seconds (an
+      event loop stall) is logged and counted. Debug mode has a cost of its
+      own, leave it off when not looking for stalls.
+    * ``profile`` profiles the event loop thread for ``duration`` seconds,
+      with cProfile (exact, slows the loop down) or by sampling its stack
+      (cheap, statistical).
+    * ``tasks`` dumps every task with the chain of coroutines it awaits.
+
+    Results are published on ``redis_diagnostics_result_channel``, or
+    written to ``diagnostics_path`` when the command asks to ``save`` them.
+    """
+
+    def __init__(self, logger: Logger, redis: Redis, metrics: Metrics, config: Config):
+        self.logger = logger
+        self.redis = redis
+        self.result_channel = config.redis_diagnostics_result_channel
+        self.path = config.diagnostics_path
+        self.max_duration = config.diagnostics_max_duration
+        self.slow_callbacks = metrics.counter('slow_callbacks')
+        self.slow_callback_handler = SlowCallbackHandler(self)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_debug = False
+        self.loop_slow_callback_duration = 0.1
+        self.profile_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_debug = self.loop.get_debug()
+        self.loop_slow_callback_duration = self.loop.slow_callback_duration
+
+    async def stop(self):
+        if self.profile_task is not None:
+            self.profile_task.cancel()
+            await asyncio.gather(self.profile_task, return_exceptions=True)
+            self.profile_task = None
+        self.detect_slow_callbacks(False)
+
+    async def execute(self, command: DiagnosticsCommand):
+        """Runs ``command``, a failure is reported on the result channel and never raised."""
+        await self.guarded(command.action.value, self.dispatch(command))
+
+    async def dispatch(self, command: DiagnosticsCommand):
+        action = command.action.value
+        if command.action == DiagnosticsCommand.Action.slow_callbacks:
+            self.detect_slow_callbacks(command.enabled, command.threshold)
+            await self.publish(action, {'enabled': command.enabled, 'threshold': command.threshold})
+        elif command.action == DiagnosticsCommand.Action.tasks:
+            await self.publish(action, {'tasks': self.task_stacks()}, 'json' if command.save else None)
+        elif self.profile_task is not None:
+            await self.publish(action, {'error': 'a profile is already running'})
+        elif not 0 < command.duration <= self.max_duration:
+            await self.publish(action, {'error': f"duration must be within (0, {self.max_duration}] seconds"})
+        else:
+            # runs in the background, the command handler must not wait for it
+            self.profile_task = asyncio.create_task(self.guarded(action, self.profile(command)))
+            self.profile_task.add_done_callback(self.profile_done)
+
+    async def guarded(self, action: str, coro):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            self.logger.error(f"diagnostics {action} failed: {ex!r}")
+            try:
+                await self.publish(action, {'error': str(ex) or repr(ex)})
+            except Exception as publish_ex:
+                self.logger.error(f"failed to publish the diagnostics error: {publish_ex!r}")
+
+    def detect_slow_callbacks(self, enabled: bool, threshold: float = 0.1):
+        if self.loop is None:
+            return
+        if enabled:
+            self.loop.slow_callback_duration = threshold
+            self.loop.set_debug(True)
+            asyncio_logger.addHandler(self.slow_callback_handler)
+            self.logger.info(f"reporting callbacks slower than {threshold}s")
+        elif self.slow_callback_handler in asyncio_logger.handlers:
+            asyncio_logger.removeHandler(self.slow_callback_handler)
+            self.loop.set_debug(self.loop_debug)
+            self.loop.slow_callback_duration = self.loop_slow_callback_duration
+            self.logger.info("slow callback reporting off")
+
+    async def profile(self, command: DiagnosticsCommand):
+        self.logger.info(f"profiling with {command.profiler} for {command.duration}s")
+        save = 'prof' if command.save else None
+        if command.profiler == 'sampling':
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+            try:
+                await asyncio.sleep(command.duration)
+            finally:
+                await asyncio.to_thread(profiler.stop)
+            if command.save:
+                save = 'folded'
+                result = profiler.folded()
+            else:
+                result = profiler.report(command.limit)
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(command.duration)
+            finally:
+                profiler.disable()
+            if command.save:
+                result = profiler
+            else:
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(command.limit)
+                result = {'report': report.getvalue()}
+        await self.publish(command.action.value, result, save)
+
+    def profile_done(self, task: asyncio.Task):
+        self.profile_task = None
+
+    @staticmethod
+    def task_stacks() -> List[Dict]:
+        tasks = []
+        for task in asyncio.all_tasks():
+            stack = []
+            awaiting = task.get_coro()
+            # follow the chain of awaits down to the innermost coroutine
+            while awaiting is not None:
+                frame = getattr(awaiting, 'cr_frame', None) or getattr(awaiting, 'gi_frame', None)
+                if frame is None:
+                    break
+                stack.append(f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}")
+                awaiting = getattr(awaiting, 'cr_await', None) or getattr(awaiting, 'gi_yieldfrom', None)
+            tasks.append({
+                'name': task.get_name(),
+                'coro': getattr(task.get_coro(), '__qualname__', repr(task.get_coro())),
+                'stack': stack,
+                'awaiting': repr(awaiting)[:200] if awaiting is not None else None,
+            })
+        return tasks
+
+    async def publish(self, action: str, result, save: Optional[str] = None):
+        timestamp = datetime.now()
+        if save is not None:
+            path = os.path.join(self.path, f"{action}-{timestamp.strftime('%Y%m%d-%H%M%S-%f')}.{save}")
+            await asyncio.to_thread(self.save, path, result)
+            self.logger.info(f"{action} written to {path}")
+            result = {'path': path}
+        elif not isinstance(result, dict):
+            result = {'result': result}
+        if 'error' in result:
+            self.logger.warning(f"{action}: {result['error']}")
+        payload = {'action': action, 'timestamp': timestamp.isoformat(), **result}
+        await self.redis.publish(self.result_channel, json.dumps(payload))
+
+    def save(self, path: str, result):
+        os.makedirs(self.path, exist_ok=True)
+        if isinstance(result, cProfile.Profile):
+            result.dump_stats(path)
+            return
+        with open(path, 'w') as f:
+            if isinstance(result, str):
+                f.write(result)
+            else:
+                json.dump(result, f, indent=2)
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+Stack = Tuple[str, ...]
+
+
+class SamplingProfiler:
+    """Statistical profiler of a single thread.
+
+    A background thread takes the stack of ``thread_id`` every ``interval``
+    seconds. Unlike cProfile nothing is hooked into the profiled thread, the
+    overhead is the sampling thread taking the GIL now and then. Stacks are
+    kept as counts, ``folded`` renders them in the format flame graph tools
+    read.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            del frame
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def report(self, limit: int) -> Dict:
+        """Functions most often on top of the stack (self) and anywhere in it (total)."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        return {
+            'samples': self.samples,
+            'interval': self.interval,
+            'self': self.top(own, limit),
+            'total': self.top(total, limit),
+        }
+
+    def top(self, counts: Counter, limit: int) -> List[Dict]:
+        return [{'function': function, 'samples': count, 'share': count / self.samples}
+                for function, count in counts.most_common(limit)]
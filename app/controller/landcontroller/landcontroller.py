@@ -1,25 +1,207 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime
 from logging import Logger
+from typing import Dict, List, Tuple
+
+from redis.asyncio import Redis
 
 from app.client import ConnectionProvider
-from app.controller.telemetrycontroller.models import LandData
+from app.config.config import Config
+from app.controller.telemetrycontroller.models import LandAck, LandData, LandDeliveryStatus
+
+
+class InFlight:
+    __slots__ = ('land_data', 'sent_at', 'attempts')
+
+    def __init__(self, land_data: LandData, sent_at: float):
+        self.land_data = land_data
+        self.sent_at = sent_at
+        self.attempts = 1
 
 
 class LandController:
-    def __init__(self, logger: Logger, conn_provider: ConnectionProvider):
+    """Prioritized, paced shore-to-boat message queue.
+
+    Messages are ordered by priority, then by ``created_at``. A message with
+    the ``id`` of a queued one supersedes it. The sender hands one message at a
+    time to the serial writer and waits for it to go out on the wire, so a
+    high priority message never waits behind queued bulk traffic. While the
+    link is down messages stay in this queue, not in the FIFO of the writer,
+    and nothing is retransmitted or given up.
+
+    With ``land_ack_enabled`` delivery is acknowledged by the controller: up
+    to ``land_window_size`` messages are in flight, acks are matched by id and
+    unacknowledged messages are retransmitted after ``land_ack_timeout``.
+    Delivery status is published to ``redis_land_status_channel``.
+    """
+
+    def __init__(self, logger: Logger, conn_provider: ConnectionProvider, redis: Redis, config: Config):
         self.logger = logger
         self.conn_provider = conn_provider
-        self.land_low_prior_queue = None
+        self.redis = redis
+        self.status_channel = config.redis_land_status_channel
+        self.queue_size = config.land_queue_size
+        self.queue: List[Tuple] = []
+        self.pending: Dict[int, LandData] = {}
+        self.sequence = itertools.count()
+        self.has_data = asyncio.Event()
+
+        self.ack_enabled = config.land_ack_enabled
+        self.window_size = config.land_window_size
+        self.ack_timeout = config.land_ack_timeout
+        self.max_retries = config.land_max_retries
+        self.in_flight: Dict[int, InFlight] = {}
+        self.window_open = asyncio.Event()
+        self.window_open.set()
+        self.in_flight_changed = asyncio.Event()
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self.tasks = [asyncio.create_task(self.sender())]
+        if self.ack_enabled:
+            self.tasks.append(asyncio.create_task(self.retransmitter()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    @staticmethod
+    def rank(land_data: LandData) -> Tuple[int, float]:
+        return -land_data.priority, land_data.created_at.timestamp()
 
     async def process_land_payload(self, land_data: LandData):
-        if land_data.priority == LandData.Priority.low:
-            self.land_low_prior_queue = land_data
+        if land_data.id not in self.pending and len(self.pending) >= self.queue_size:
+            worst = max(self.pending.values(), key=self.rank)
+            if self.rank(land_data) >= self.rank(worst):
+                worst = land_data
+            else:
+                del self.pending[worst.id]
+            self.logger.warning(f"land queue is full, dropped message {worst.id}")
+            await self.publish_status(worst.id, LandDeliveryStatus.Status.dropped, 0)
+            if worst is land_data:
+                return
+
+        # a superseded entry stays in the heap and is skipped when popped
+        self.pending[land_data.id] = land_data
+        heapq.heappush(self.queue, (*self.rank(land_data), next(self.sequence), land_data))
+        if len(self.queue) > 2 * self.queue_size:
+            self.compact()
+        self.has_data.set()
+
+    async def process_ack(self, ack: LandAck):
+        entry = self.in_flight.pop(ack.ack, None)
+        if entry is None:
+            # duplicate ack of a retransmitted message
+            return
+        self.update_window()
+        await self.publish_status(ack.ack, LandDeliveryStatus.Status.delivered, entry.attempts)
+
+    def compact(self):
+        self.queue = [entry for entry in self.queue if self.pending.get(entry[-1].id) is entry[-1]]
+        heapq.heapify(self.queue)
+
+    def update_window(self):
+        if len(self.in_flight) < self.window_size:
+            self.window_open.set()
         else:
-            raise NotImplementedError("High priority not implemented")
+            self.window_open.clear()
+        self.in_flight_changed.set()
+
+    async def next_payload(self) -> LandData:
+        while True:
+            await self.has_data.wait()
+            # popped only once the link is up, so a later message can still overtake it
+            await self.conn_provider.connected.wait()
+            while self.queue:
+                land_data = heapq.heappop(self.queue)[-1]
+                if self.pending.get(land_data.id) is land_data:
+                    del self.pending[land_data.id]
+                    return land_data
+            self.has_data.clear()
+
+    async def sender(self):
+        while True:
+            await self.window_open.wait()
+            land_data = await self.next_payload()
+            # in flight before it goes out, the ack may come back while the send is still pacing
+            entry = None
+            if self.ack_enabled:
+                entry = self.in_flight[land_data.id] = InFlight(land_data, time.monotonic())
+                self.update_window()
+            try:
+                await self.send_serial(land_data)
+            except Exception as ex:
+                if entry is not None and self.in_flight.get(land_data.id) is entry:
+                    del self.in_flight[land_data.id]
+                    self.update_window()
+                self.logger.error(f"failed to send land message {land_data.id}: {ex!r}")
+                await self.publish_status(land_data.id, LandDeliveryStatus.Status.failed, 1)
+                continue
+
+            if entry is not None:
+                if self.in_flight.get(land_data.id) is not entry:
+                    # already acknowledged, delivered was published
+                    continue
+                # the ack timeout runs from the end of the transmission
+                entry.sent_at = time.monotonic()
+            await self.publish_status(land_data.id, LandDeliveryStatus.Status.sent, 1)
+
+    async def retransmitter(self):
+        while True:
+            self.in_flight_changed.clear()
+            if not self.in_flight:
+                await self.in_flight_changed.wait()
+                continue
+            await self.conn_provider.connected.wait()
+
+            deadline = min(entry.sent_at for entry in self.in_flight.values()) + self.ack_timeout
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.in_flight_changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            for msg_id, entry in list(self.in_flight.items()):
+                if entry.sent_at + self.ack_timeout > now:
+                    continue
+                if entry.attempts > self.max_retries:
+                    del self.in_flight[msg_id]
+                    self.update_window()
+                    self.logger.warning(f"land message {msg_id} was not acknowledged, giving up")
+                    await self.publish_status(msg_id, LandDeliveryStatus.Status.failed, entry.attempts)
+                    continue
+
+                entry.attempts += 1
+                entry.sent_at = time.monotonic()
+                try:
+                    await self.send_serial(entry.land_data)
+                except Exception as ex:
+                    self.logger.error(str(ex))
+                if self.in_flight.get(msg_id) is entry:
+                    await self.publish_status(msg_id, LandDeliveryStatus.Status.retransmitted, entry.attempts)
+
+    async def send_serial(self, land_data: LandData):
+        data = land_data.model_dump_json()
+        await self.conn_provider.send(data)
+        # pace by the line rate so the serial write queue never builds up
+        await asyncio.sleep(self.wire_time(len(data) + 1))
 
-    async def send_serial(self):  # TODO: implement land low prior queue
-        if self.land_low_prior_queue is not None:
-            data = self.land_low_prior_queue.json()
-            async with self.conn_provider as conn:
-                await conn.send(data)
+    def wire_time(self, size: int) -> float:
+        cfg = self.conn_provider.config
+        bits_per_byte = 1 + cfg.bytesize + (cfg.parity != 'N') + cfg.stopbits
+        return size * bits_per_byte / cfg.baudrate
 
-            self.land_low_prior_queue = None
+    async def publish_status(self, msg_id: int, status: LandDeliveryStatus.Status, attempts: int):
+        payload = LandDeliveryStatus(id=msg_id, status=status, attempts=attempts, timestamp=datetime.now())
+        try:
+            await self.redis.publish(self.status_channel, payload.model_dump_json())
+        except Exception as ex:
+            self.logger.error(f"failed to publish land delivery status: {ex}")
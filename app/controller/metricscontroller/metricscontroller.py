@@ -0,0 +1,72 @@
+import asyncio
+import json
+from datetime import datetime
+from logging import Logger
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from app.config.config import Config
+from app.metrics import Metrics
+from app.scheduler import Job, Scheduler
+
+
+class MetricsController:
+    """Publishes the metrics registry.
+
+    Every ``metrics_interval`` seconds the snapshot is written to the
+    ``redis_metrics_key`` hash and published on ``redis_metrics_channel``.
+    With ``metrics_port`` set the registry is also served as plain text
+    (Prometheus format) on a local HTTP endpoint.
+    """
+
+    def __init__(self, logger: Logger, redis: Redis, scheduler: Scheduler, metrics: Metrics, config: Config):
+        self.logger = logger
+        self.redis = redis
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.interval = config.metrics_interval
+        self.key = config.redis_metrics_key
+        self.channel = config.redis_metrics_channel
+        self.host = config.metrics_host
+        self.port = config.metrics_port
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.job: Optional[Job] = None
+
+    async def start(self):
+        self.job = self.scheduler.every(f"metrics:{self.key}", self.interval, self.publish_metrics)
+        if self.port is not None:
+            self.server = await asyncio.start_server(self.serve, self.host, self.port)
+            self.logger.info(f"serving metrics on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.job is not None:
+            self.scheduler.cancel(self.job)
+            self.job = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def publish_metrics(self):
+        snapshot = self.metrics.snapshot()
+        if not snapshot:
+            return
+        payload = json.dumps({'timestamp': datetime.now().isoformat(), 'metrics': snapshot})
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(self.key, mapping=snapshot)
+            pipe.publish(self.channel, payload)
+            await pipe.execute()
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # the request itself does not matter, every path returns the registry
+            await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+            body = self.metrics.render().encode()
+            writer.write(b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
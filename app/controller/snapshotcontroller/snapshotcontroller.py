@@ -0,0 +1,34 @@
+from logging import Logger
+from typing import Optional
+
+from app.config.config import Config
+from app.controller.telemetrycontroller.models import Telemetry
+from app.controller.telemetrycontroller.snapshot import SnapshotWriter
+
+
+class SnapshotController:
+    """Keeps the latest telemetry sample in ``telemetry_snapshot_path``.
+
+    A telemetry stage for consumers on the same host (dashboards, the
+    autopilot) that only need the current values: they read the file with
+    ``SnapshotReader`` instead of subscribing to Redis. A write is a few
+    ``struct`` packs into shared memory.
+    """
+
+    def __init__(self, logger: Logger, config: Config):
+        self.logger = logger
+        self.path = config.telemetry_snapshot_path
+        self.writer: Optional[SnapshotWriter] = None
+
+    async def start(self):
+        self.writer = SnapshotWriter(self.path)
+        self.logger.info(f"publishing the latest telemetry to {self.path}")
+
+    async def stop(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def process_telemetry(self, telemetry: Telemetry):
+        if self.writer is not None:
+            self.writer.write(telemetry)
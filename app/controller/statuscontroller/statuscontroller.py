@@ -0,0 +1,78 @@
+from datetime import datetime
+from logging import Logger
+from typing import Dict, List, Optional
+
+from redis.asyncio import Redis
+
+from app.client import Connection
+from app.config.config import Config
+from app.controller.telemetrycontroller.telemetrycontroller import TelemetryController
+from app.payloads import UpdateStatus
+from app.scheduler import Job, Scheduler
+from app.status import AppStatus
+
+
+class StatusController:
+    """Publishes the connector status to ``redis_status_update_channel``.
+
+    The status is ``starting`` until every serial link came up once, then
+    ``running`` while they are all up, ``failing`` while one is down and
+    ``degraded`` while a telemetry queue sheds load. Queue depth, drop and
+    decimation counters of every device go along. The status is published
+    every ``status_update_interval`` seconds as a heartbeat, and right away
+    when it changes.
+    """
+
+    def __init__(self, logger: Logger, redis: Redis, scheduler: Scheduler, connections: List[Connection],
+                 telemetry_controllers: Dict[str, TelemetryController], config: Config):
+        self.logger = logger
+        self.redis = redis
+        self.scheduler = scheduler
+        self.connections = connections
+        self.telemetry_controllers = telemetry_controllers
+        self.channel = config.redis_status_update_channel
+        self.interval = config.status_update_interval
+        self.status = AppStatus.Starting
+        self.job: Optional[Job] = None
+
+    async def start(self):
+        self.job = self.scheduler.every("status_update", self.interval, self.refresh, delay=0)
+        for conn in self.connections:
+            conn.state_listeners.append(self.status_changed)
+        for controller in self.telemetry_controllers.values():
+            controller.overload_listeners.append(self.status_changed)
+
+    async def stop(self):
+        for conn in self.connections:
+            conn.state_listeners.remove(self.status_changed)
+        for controller in self.telemetry_controllers.values():
+            controller.overload_listeners.remove(self.status_changed)
+        if self.job is not None:
+            self.scheduler.cancel(self.job)
+            self.job = None
+
+    def status_changed(self):
+        if self.current_status() != self.status:
+            self.scheduler.call_later("status_change", 0, self.refresh)
+
+    def current_status(self) -> AppStatus:
+        if all(conn.is_connected() for conn in self.connections):
+            if any(controller.overloaded for controller in self.telemetry_controllers.values()):
+                return AppStatus.Degraded
+            return AppStatus.Running
+        if self.status == AppStatus.Starting:
+            return AppStatus.Starting
+        return AppStatus.Failing
+
+    async def refresh(self):
+        status = self.current_status()
+        if status != self.status:
+            self.logger.info(f"status {self.status.value} -> {status.value}")
+            self.status = status
+        payload = UpdateStatus(
+            timestamp=datetime.now(),
+            status=self.status,
+            telemetry_queues={name: controller.queue_status()
+                              for name, controller in self.telemetry_controllers.items()},
+        )
+        await self.redis.publish(self.channel, payload.model_dump_json())
@@ -0,0 +1,205 @@
+"""Append-only columnar telemetry archive.
+
+The archive is a directory of chunks, ``chunk-000001`` and so on, each a
+directory with one raw little endian array file per column:
+``created_at.f8`` (unix time) and one ``<field>.i8`` or ``<field>.f8`` per
+telemetry field, plus ``schema.json`` naming the columns and their dtypes.
+A chunk holds at most ``chunk_rows`` rows, timestamps never go back within
+a chunk, so ``created_at`` is the sorted index of the chunk.
+
+Column files have no header, ``np.memmap`` maps them as they are. A crash
+between column writes leaves columns of different lengths, readers use the
+shortest.
+"""
+import json
+import os
+import re
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.controller.telemetrycontroller.models import Telemetry, telemetry_fields
+
+TIMESTAMP = 'created_at'
+version = 1
+chunk_pattern = re.compile(r'chunk-(\d+)$')
+
+dtype = np.dtype([(TIMESTAMP, '<f8')] + [
+    (name, '<i8' if Telemetry.model_fields[name].annotation is int else '<f8')
+    for name in telemetry_fields
+])
+
+TimeBound = Union[None, float, datetime]
+
+
+def chunk_directories(directory: str) -> List[Tuple[int, str]]:
+    if not os.path.isdir(directory):
+        return []
+    chunks = []
+    for entry in os.listdir(directory):
+        match = chunk_pattern.match(entry)
+        if match:
+            chunks.append((int(match.group(1)), os.path.join(directory, entry)))
+    return sorted(chunks)
+
+
+def column_filename(name: str, column_dtype: np.dtype) -> str:
+    return f"{name}.{column_dtype.kind}{column_dtype.itemsize}"
+
+
+class ArchiveWriter:
+    """Appends rows of ``dtype`` to the chunk files, blocking, run it in a thread.
+
+    A restart always begins a new chunk, so a chunk is only ever written by
+    one writer.
+    """
+
+    def __init__(self, directory: str, chunk_rows: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        existing = chunk_directories(directory)
+        self.chunk = existing[-1][0] if existing else 0
+        self.files: Dict[str, BinaryIO] = {}
+        self.rows = 0
+        self.last_timestamp = 0.0
+
+    def next_chunk(self):
+        self.close()
+        self.chunk += 1
+        path = os.path.join(self.directory, f"chunk-{self.chunk:06d}")
+        os.makedirs(path)
+        columns = {name: dtype[name].str for name in dtype.names}
+        with open(os.path.join(path, 'schema.json'), 'w') as f:
+            json.dump({'version': version, 'columns': columns}, f)
+        self.files = {name: open(os.path.join(path, column_filename(name, dtype[name])), 'ab')
+                      for name in dtype.names}
+        self.rows = 0
+
+    def write(self, rows: Iterable[tuple]) -> None:
+        """Appends ``(created_at, *telemetry fields)`` tuples."""
+        data = np.array(list(rows), dtype=dtype)
+        timestamps = data[TIMESTAMP]
+        start = 0
+        while start < len(data):
+            if not self.files or self.rows >= self.chunk_rows or timestamps[start] < self.last_timestamp:
+                # the clock stepped back, the index of a chunk must stay sorted
+                self.next_chunk()
+            end = min(len(data), start + self.chunk_rows - self.rows)
+            stepped_back = np.flatnonzero(np.diff(timestamps[start:end]) < 0)
+            if len(stepped_back):
+                end = start + stepped_back[0] + 1
+            for name, f in self.files.items():
+                f.write(data[name][start:end].tobytes())
+            self.rows += end - start
+            self.last_timestamp = timestamps[end - 1]
+            start = end
+        for f in self.files.values():
+            f.flush()
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+
+class ArchiveChunk:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'schema.json')) as f:
+            schema = json.load(f)
+        if schema['version'] != version:
+            raise ValueError(f"{path}: unsupported archive version {schema['version']}")
+        self.dtypes = {name: np.dtype(column) for name, column in schema['columns'].items()}
+        self.columns: Dict[str, np.ndarray] = {}
+        self.rows = min(self.file_rows(name) for name in self.dtypes)
+
+    def file_rows(self, name: str) -> int:
+        path = os.path.join(self.path, column_filename(name, self.dtypes[name]))
+        return os.path.getsize(path) // self.dtypes[name].itemsize if os.path.exists(path) else 0
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            column_dtype = self.dtypes[name]
+            path = os.path.join(self.path, column_filename(name, column_dtype))
+            self.columns[name] = np.memmap(path, dtype=column_dtype, mode='r', shape=(self.rows,))
+        return self.columns[name]
+
+    def span(self) -> Tuple[float, float]:
+        timestamps = self.column(TIMESTAMP)
+        return float(timestamps[0]), float(timestamps[-1])
+
+
+class ArchiveReader:
+    """Time range queries over an archive, column files are memory mapped.
+
+    ``read`` returns ``{column: array}`` for ``start <= created_at < end``,
+    either bound may be omitted. Rows are located by binary search on the
+    ``created_at`` of each chunk, only the selected rows of the selected
+    columns are ever paged in. A range within one chunk returns read-only
+    views of the mapped files, a range over several chunks is concatenated.
+
+    Chunks written after the reader was opened are picked up by ``refresh``.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.chunks: List[ArchiveChunk] = []
+        self.refresh()
+
+    def refresh(self):
+        # only the last chunk can still be growing, earlier ones keep their maps
+        known = {chunk.path: chunk for chunk in self.chunks[:-1]}
+        chunks = []
+        for _, path in chunk_directories(self.directory):
+            chunk = known.get(path) or ArchiveChunk(path)
+            if chunk.rows:
+                chunks.append(chunk)
+        self.chunks = chunks
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(self.chunks[0].dtypes) if self.chunks else ()
+
+    def read(self, start: TimeBound = None, end: TimeBound = None,
+             fields: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        start, end = self.timestamp(start), self.timestamp(end)
+        names = [TIMESTAMP] + [name for name in (fields or telemetry_fields) if name != TIMESTAMP]
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        for chunk in self.chunks:
+            first, last = chunk.span()
+            if (start is not None and last < start) or (end is not None and first >= end):
+                continue
+            timestamps = chunk.column(TIMESTAMP)
+            lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+            hi = chunk.rows if end is None else int(np.searchsorted(timestamps, end, side='left'))
+            if lo >= hi:
+                continue
+            for name in names:
+                if name not in chunk.dtypes:
+                    raise KeyError(f"no column {name} in {chunk.path}")
+                parts[name].append(chunk.column(name)[lo:hi])
+
+        columns = {}
+        for name in names:
+            if len(parts[name]) == 1:
+                columns[name] = parts[name][0]
+            elif parts[name]:
+                columns[name] = np.concatenate(parts[name])
+            else:
+                columns[name] = np.empty(0, dtype=dtype[name] if name in dtype.names else np.float64)
+        return columns
+
+    @staticmethod
+    def timestamp(bound: TimeBound) -> Optional[float]:
+        return bound.timestamp() if isinstance(bound, datetime) else bound
+
+    def close(self):
+        self.chunks = []
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,77 @@
+import binascii
+import struct
+
+from app.client.serialclient import cobs
+from app.controller.telemetrycontroller.models import LandAck, Telemetry, TelemetryFrame
+from app.errors import FrameDecodeError
+
+# Binary frame layout, little endian, before COBS encoding:
+#   type u8 | length u8 | body (length bytes) | crc16 u16
+# crc16 is CRC-16/CCITT-FALSE over type, length and body.
+
+TELEMETRY_FRAME_TYPE = 0x01
+ACK_FRAME_TYPE = 0x02
+
+header = struct.Struct('<BB')
+crc = struct.Struct('<H')
+telemetry_body = struct.Struct('<iiddddddd')
+telemetry_fields = (
+    'controller_watts',
+    'time_to_go',
+    'controller_volts',
+    'MPPT_volts',
+    'MPPT_watts',
+    'motor_temp',
+    'motor_revols',
+    'position_lat',
+    'position_lng',
+)
+ack_body = struct.Struct('<q')
+
+
+def is_binary_frame(frame: bytes) -> bool:
+    return len(frame) > 0 and frame[0] == TELEMETRY_FRAME_TYPE
+
+
+def is_ack_frame(frame: bytes) -> bool:
+    return len(frame) > 0 and frame[0] == ACK_FRAME_TYPE
+
+
+def check_frame(frame: bytes, frame_type: int, body: struct.Struct) -> None:
+    size = header.size + body.size + crc.size
+    if len(frame) != size:
+        raise FrameDecodeError(f"frame of {len(frame)} bytes, expected {size}")
+    actual_type, length = header.unpack_from(frame)
+    if actual_type != frame_type or length != body.size:
+        raise FrameDecodeError(f"unexpected frame type {actual_type} of {length} bytes")
+    (checksum,) = crc.unpack_from(frame, header.size + length)
+    if binascii.crc_hqx(frame[:header.size + length], 0xFFFF) != checksum:
+        raise FrameDecodeError("frame crc mismatch")
+
+
+def decode_telemetry(frame: bytes) -> Telemetry:
+    check_frame(frame, TELEMETRY_FRAME_TYPE, telemetry_body)
+    values = telemetry_body.unpack_from(frame, header.size)
+    return TelemetryFrame.model_validate(dict(zip(telemetry_fields, values)))
+
+
+def decode_ack(frame: bytes) -> LandAck:
+    check_frame(frame, ACK_FRAME_TYPE, ack_body)
+    (ack,) = ack_body.unpack_from(frame, header.size)
+    return LandAck(ack=ack)
+
+
+def encode_frame(frame_type: int, body: bytes) -> bytes:
+    """Builds the wire form of a frame, ``0x00 <cobs> 0x00``, as the controller sends it."""
+    frame = header.pack(frame_type, len(body)) + body
+    frame += crc.pack(binascii.crc_hqx(frame, 0xFFFF))
+    return b'\x00' + cobs.encode(frame) + b'\x00'
+
+
+def encode_telemetry(telemetry: Telemetry) -> bytes:
+    return encode_frame(TELEMETRY_FRAME_TYPE,
+                        telemetry_body.pack(*(getattr(telemetry, name) for name in telemetry_fields)))
+
+
+def encode_ack(ack: LandAck) -> bytes:
+    return encode_frame(ACK_FRAME_TYPE, ack_body.pack(ack.ack))
@@ -0,0 +1,97 @@
+"""Change-only telemetry encoding.
+
+Two kinds of messages share the telemetry channel (or stream):
+
+* keyframe ``{"k": seq, "created_at": ..., <every field>}``
+* delta ``{"d": seq, "created_at": ..., <changed fields>}``
+
+``seq`` grows by one per message. A field goes into a delta when it moved
+beyond its deadband since the value last published, so slow drift still
+gets through. Samples where nothing moved are not published at all, the
+consumer keeps the previous values. A keyframe is published every
+``keyframe_interval`` seconds, so a consumer that joins late or misses a
+message (pub/sub gives no delivery guarantee) resyncs within that interval.
+"""
+import json
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Union
+
+from app.controller.telemetrycontroller.models import Telemetry, check_fields, telemetry_fields
+
+KEYFRAME = 'k'
+DELTA = 'd'
+
+
+class DeltaEncoder:
+    def __init__(self, keyframe_interval: float, deadbands: Optional[Dict[str, float]] = None,
+                 fields: Optional[Sequence[str]] = None):
+        unknown = set(deadbands or ()) - set(telemetry_fields)
+        if unknown:
+            raise ValueError(f"deadband for unknown telemetry fields {sorted(unknown)}")
+        self.keyframe_interval = keyframe_interval
+        self.fields = check_fields(fields)
+        self.deadbands = tuple((deadbands or {}).get(name, 0) for name in self.fields)
+        self.published: Optional[tuple] = None
+        self.keyframe_at = 0.0
+        self.seq = 0
+
+    def get_values(self, telemetry: Telemetry) -> tuple:
+        # not attrgetter, it returns a bare value for a single field
+        return tuple(getattr(telemetry, name) for name in self.fields)
+
+    def encode(self, telemetry: Telemetry) -> Optional[str]:
+        """Returns the message for ``telemetry``, or None if nothing changed."""
+        values = self.get_values(telemetry)
+        now = time.monotonic()
+        if self.published is None or now - self.keyframe_at >= self.keyframe_interval:
+            self.published = values
+            self.keyframe_at = now
+            return self.message(KEYFRAME, telemetry.created_at, zip(self.fields, values))
+
+        changed = []
+        published = list(self.published)
+        for i, (value, last, deadband) in enumerate(zip(values, self.published, self.deadbands)):
+            if abs(value - last) > deadband:
+                changed.append((self.fields[i], value))
+                published[i] = value
+        if not changed:
+            return None
+        self.published = tuple(published)
+        return self.message(DELTA, telemetry.created_at, changed)
+
+    def message(self, kind: str, created_at: datetime, fields) -> str:
+        self.seq += 1
+        payload = {kind: self.seq, 'created_at': created_at.isoformat()}
+        payload.update(fields)
+        return json.dumps(payload, separators=(',', ':'))
+
+
+class DeltaDecoder:
+    """Reference decoder, rebuilds full samples from keyframes and deltas.
+
+    Returns None until the first keyframe and after a gap in ``seq`` until
+    the next keyframe, rather than publishing a sample with stale fields.
+    Fields the device does not send (see ``DeviceConfig.fields``) are 0.
+    """
+
+    def __init__(self, fields: Optional[Sequence[str]] = None):
+        self.missing = dict.fromkeys(set(telemetry_fields) - set(check_fields(fields)), 0)
+        self.values: Optional[dict] = None
+        self.seq = 0
+
+    def decode(self, payload: Union[str, bytes]) -> Optional[Telemetry]:
+        message = json.loads(payload)
+        if KEYFRAME in message:
+            self.seq = message.pop(KEYFRAME)
+            self.values = message
+        elif DELTA in message:
+            seq = message.pop(DELTA)
+            if self.values is None or seq != self.seq + 1:
+                self.values = None
+                return None
+            self.seq = seq
+            self.values.update(message)
+        else:
+            raise ValueError("neither a keyframe nor a delta")
+        return Telemetry.model_validate({**self.missing, **self.values})
@@ -1,7 +1,9 @@
 from datetime import datetime
-from enum import IntEnum
+from enum import Enum, IntEnum
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple, Type
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 
 
 class Telemetry(BaseModel):
@@ -17,6 +19,40 @@ class Telemetry(BaseModel):
     position_lng: float
 
 
+telemetry_fields = tuple(name for name in Telemetry.model_fields if name != 'created_at')
+
+
+class TelemetryFrame(Telemetry):
+    """Telemetry as sent by the controller.
+
+    The controller clock is not trusted: ``created_at`` is never read from the
+    frame (it is aliased away) and is stamped with the connector time while
+    the frame is validated.
+    """
+    created_at: datetime = Field(default_factory=datetime.now, validation_alias='connector_created_at')
+
+
+def check_fields(fields: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    """The telemetry fields a device sends, all of them when ``fields`` is None."""
+    if fields is None:
+        return telemetry_fields
+    if not fields:
+        raise ValueError("at least one telemetry field is required")
+    unknown = set(fields) - set(telemetry_fields)
+    if unknown:
+        raise ValueError(f"unknown telemetry fields {sorted(unknown)}")
+    return tuple(name for name in telemetry_fields if name in fields)
+
+
+@lru_cache(maxsize=None)
+def telemetry_frame_model(fields: Tuple[str, ...]) -> Type[TelemetryFrame]:
+    """Frame model of a device sending only ``fields``, the others default to 0."""
+    if fields == telemetry_fields:
+        return TelemetryFrame
+    defaults = {name: (Telemetry.model_fields[name].annotation, 0) for name in telemetry_fields if name not in fields}
+    return create_model('PartialTelemetryFrame', __base__=TelemetryFrame, **defaults)
+
+
 class LandData(BaseModel):
     class Priority(IntEnum):
         low = 0
@@ -26,3 +62,21 @@ class LandData(BaseModel):
     created_at: datetime
     id: int
     data: str
+
+
+class LandAck(BaseModel):
+    ack: int  # id of the received LandData
+
+
+class LandDeliveryStatus(BaseModel):
+    class Status(str, Enum):
+        sent = 'sent'
+        delivered = 'delivered'
+        retransmitted = 'retransmitted'
+        failed = 'failed'
+        dropped = 'dropped'
+
+    id: int
+    status: Status
+    attempts: int
+    timestamp: datetime
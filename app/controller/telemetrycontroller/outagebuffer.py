@@ -0,0 +1,148 @@
+import mmap
+import os
+import struct
+from typing import Iterable, List
+
+# File layout: a fixed header followed by a ring of records.
+#   header: magic | version u32 | capacity u64 | head u64 | tail u64 | count u64 | dropped u64
+#   record: length u32 | payload
+# A record never wraps around the end of the ring, a length of 0xFFFFFFFF (or
+# no room left for a length) at the read position means "continue at 0".
+
+header = struct.Struct('<4sIQQQQQ')
+length = struct.Struct('<I')
+magic = b'SCOB'
+version = 1
+wrap_marker = 0xFFFFFFFF
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+
+class OutageBuffer:
+    """Append-only, memory-mapped ring of telemetry payloads.
+
+    Used while Redis is unreachable, records are kept in arrival (and so
+    timestamp) order and survive a restart of the connector. When the ring is
+    full either the oldest records are evicted or new ones are dropped.
+    """
+
+    def __init__(self, path: str, capacity: int, policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"unknown eviction policy {policy}")
+        self.path = path
+        self.capacity = capacity
+        self.policy = policy
+        self.file = self.open_file()
+        self.map = mmap.mmap(self.file.fileno(), header.size + capacity)
+        self.data = memoryview(self.map)[header.size:]
+        self.head = self.tail = self.count = self.dropped = 0
+        self.load_header()
+
+    def open_file(self):
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        f = open(self.path, 'a+b')
+        f.seek(0)
+        size = header.size + self.capacity
+        if os.fstat(f.fileno()).st_size != size:
+            f.truncate(0)
+            f.truncate(size)
+        return f
+
+    def load_header(self):
+        file_magic, file_version, capacity, head, tail, count, dropped = header.unpack_from(self.map)
+        if file_magic == magic and file_version == version and capacity == self.capacity:
+            self.head, self.tail, self.count, self.dropped = head, tail, count, dropped
+        else:
+            self.save_header()
+
+    def save_header(self):
+        header.pack_into(self.map, 0, magic, version, self.capacity,
+                         self.head, self.tail, self.count, self.dropped)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def extend(self, payloads: Iterable[bytes]) -> None:
+        for payload in payloads:
+            self.append(payload)
+        self.save_header()
+
+    def append(self, payload: bytes) -> bool:
+        if isinstance(payload, str):
+            payload = payload.encode('UTF-8')
+        need = length.size + len(payload)
+        if need > self.capacity:
+            self.dropped += 1
+            return False
+
+        while True:
+            if self.count == 0:
+                self.head = self.tail = 0
+            # tail == head with records in the ring means the ring is wrapped and full
+            if self.count == 0 or self.tail > self.head:
+                if self.tail + need <= self.capacity:
+                    break
+                if self.head >= need:
+                    self.mark_wrap(self.tail)
+                    self.tail = 0
+                    continue
+            elif self.tail + need <= self.head:
+                break
+
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            self.pop()
+            self.dropped += 1
+
+        length.pack_into(self.data, self.tail, len(payload))
+        start = self.tail + length.size
+        self.data[start:start + len(payload)] = payload
+        self.tail = start + len(payload)
+        self.count += 1
+        return True
+
+    def mark_wrap(self, offset: int):
+        if offset + length.size <= self.capacity:
+            length.pack_into(self.data, offset, wrap_marker)
+
+    def read_at(self, offset: int):
+        """Returns the record offset (following a wrap) and its length."""
+        if offset + length.size > self.capacity:
+            offset = 0
+        (size,) = length.unpack_from(self.data, offset)
+        if size == wrap_marker:
+            offset = 0
+            (size,) = length.unpack_from(self.data, offset)
+        return offset, size
+
+    def pop(self) -> None:
+        offset, size = self.read_at(self.head)
+        self.head = offset + length.size + size
+        self.count -= 1
+
+    def peek(self, n: int) -> List[bytes]:
+        """Returns up to ``n`` oldest records without removing them."""
+        records = []
+        offset = self.head
+        for _ in range(min(n, self.count)):
+            offset, size = self.read_at(offset)
+            start = offset + length.size
+            records.append(bytes(self.data[start:start + size]))
+            offset = start + size
+        return records
+
+    def consume(self, n: int) -> None:
+        for _ in range(min(n, self.count)):
+            self.pop()
+        self.save_header()
+
+    def close(self) -> None:
+        self.save_header()
+        self.data.release()
+        self.map.flush()
+        self.map.close()
+        self.file.close()
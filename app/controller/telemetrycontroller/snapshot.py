@@ -0,0 +1,131 @@
+"""Latest telemetry sample in a memory-mapped file, for co-located readers.
+
+File layout, little endian:
+  magic 4s | version u32 | seq u64 | created_at f64 (unix time) | telemetry fields | crc32 u32
+
+The record is protected by a seqlock: the writer makes ``seq`` odd, writes
+the sample and makes it even again. A reader retries while ``seq`` is odd or
+changed under it, so it never sees a torn sample and never blocks the
+writer. ``seq`` is 0 until the first sample and grows by 2 per sample.
+
+Python has no memory barriers, the seqlock alone only holds where stores
+become visible in program order (x86). On weakly ordered CPUs (ARM) a reader
+could see the new ``seq`` before the body, so the body carries a CRC32 and a
+reader also retries until the checksum matches.
+
+The file lives in ``/dev/shm`` by default, reading it is a couple of
+``struct`` unpacks, no Redis round trip and no JSON.
+"""
+import mmap
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+from operator import attrgetter
+from typing import Optional, Tuple
+
+from app.controller.telemetrycontroller.models import Telemetry, telemetry_fields
+
+header = struct.Struct('<4sI')
+seq_field = struct.Struct('<Q')
+body = struct.Struct('<diiddddddd')
+check_field = struct.Struct('<I')
+magic = b'SCTS'
+version = 2
+seq_offset = header.size
+body_offset = seq_offset + seq_field.size
+check_offset = body_offset + body.size
+size = check_offset + check_field.size
+
+
+class SnapshotWriter:
+    def __init__(self, path: str):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        # the file is reused across restarts, so readers that keep it open stay valid
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size != size:
+            self.file.truncate(0)
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        header.pack_into(self.map, 0, magic, version)
+        (seq,) = seq_field.unpack_from(self.map, seq_offset)
+        # a writer killed mid-update leaves seq odd
+        self.seq = seq + (seq & 1)
+        seq_field.pack_into(self.map, seq_offset, self.seq)
+        self.get_values = attrgetter(*telemetry_fields)
+
+    def write(self, telemetry: Telemetry) -> None:
+        data = body.pack(telemetry.created_at.timestamp(), *self.get_values(telemetry))
+        seq_field.pack_into(self.map, seq_offset, self.seq + 1)
+        self.map[body_offset:check_offset] = data
+        check_field.pack_into(self.map, check_offset, zlib.crc32(data))
+        self.seq += 2
+        seq_field.pack_into(self.map, seq_offset, self.seq)
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
+
+
+class SnapshotReader:
+    """Reads the latest sample published by the connector.
+
+    ``read_raw`` returns ``(seq, created_at, *fields)`` as plain numbers,
+    ``read`` a ``Telemetry``; both return None before the first sample.
+    Compare ``seq`` with the previous one to tell if a new sample arrived.
+    """
+    timeout = 1.0
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        file_magic, file_version = header.unpack_from(self.map)
+        if file_magic != magic or file_version != version:
+            self.close()
+            raise ValueError(f"{path} is not a telemetry snapshot")
+
+    @property
+    def seq(self) -> int:
+        return seq_field.unpack_from(self.map, seq_offset)[0]
+
+    def read_raw(self) -> Optional[Tuple]:
+        deadline = None
+        while True:
+            (before,) = seq_field.unpack_from(self.map, seq_offset)
+            if not before & 1:
+                data = self.map[body_offset:check_offset]
+                (check,) = check_field.unpack_from(self.map, check_offset)
+                (after,) = seq_field.unpack_from(self.map, seq_offset)
+                if before == after:
+                    if before == 0:
+                        return None
+                    if zlib.crc32(data) == check:
+                        return (before,) + body.unpack(data)
+            # the writer is mid-update, give it the CPU (or the GIL) to finish
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.timeout
+            elif now > deadline:
+                raise TimeoutError("telemetry snapshot kept changing while being read")
+            time.sleep(0)
+
+    def read(self) -> Optional[Telemetry]:
+        raw = self.read_raw()
+        if raw is None:
+            return None
+        values = dict(zip(telemetry_fields, raw[2:]))
+        return Telemetry(created_at=datetime.fromtimestamp(raw[1]), **values)
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> 'SnapshotReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,16 +1,247 @@
+import asyncio
+import time
+from collections import deque
 from logging import Logger
+from typing import Callable, Deque, List, Optional
 
 from redis.asyncio import Redis
 
 from app.config.config import Config
-from app.controller.telemetrycontroller.models import Telemetry
+from app.controller.telemetrycontroller.delta import DeltaEncoder
+from app.controller.telemetrycontroller.models import Telemetry, check_fields, telemetry_fields
+from app.controller.telemetrycontroller.outagebuffer import OutageBuffer
+from app.metrics import Metrics, disabled_metrics
+from app.payloads import QueueStatus
 
 
 class TelemetryController:
-    def __init__(self, logger: Logger, redis: Redis, config: Config):
+    """Publishes telemetry in micro-batches.
+
+    Payloads are collected until ``telemetry_batch_size`` frames are queued or
+    ``telemetry_batch_interval`` seconds passed since the first one, then sent
+    in a single Redis pipeline. Every frame is also handed to the registered
+    stages (aggregation and the like), which must not block.
+
+    While Redis is unreachable batches go to an on-disk outage buffer, the
+    backlog is replayed in bulk and in order once a publish succeeds again.
+
+    With ``telemetry_output=stream`` payloads are appended to a Redis Stream
+    capped with ``MAXLEN ~ telemetry_stream_maxlen`` instead of being published,
+    every entry holds the JSON payload in a single ``d`` field.
+
+    With ``telemetry_delta_enabled`` payloads are keyframes and change-only
+    deltas instead of full samples, see ``delta.py``.
+
+    Ingest never waits for Redis: at most ``telemetry_queue_size`` payloads
+    wait for publishing, beyond that ``telemetry_queue_policy`` drops the
+    oldest or the newest frames. Above the high watermark the controller
+    counts as overloaded, with the ``decimate`` policy it then only takes
+    every ``telemetry_decimate_factor``-th sample. Overload ends once the
+    queue is down to half the watermark.
+    """
+    stream_payload_field = 'd'
+
+    def __init__(self, logger: Logger, redis: Redis, config: Config, metrics: Metrics = disabled_metrics):
         self.logger = logger
         self.redis = redis
         self.config = config
+        self.publish_time = metrics.histogram('redis_publish')
+        self.frames_published = metrics.counter('frames_published')
+        self.publish_errors = metrics.counter('publish_errors')
+        self.frames_buffered = metrics.counter('frames_buffered')
+        self.fields = check_fields(config.telemetry_fields)
+        # a device sending some of the fields publishes only those
+        self.include = None if self.fields == telemetry_fields else {'created_at', *self.fields}
+        self.delta_encoder: Optional[DeltaEncoder] = None
+        if config.telemetry_delta_enabled:
+            self.delta_encoder = DeltaEncoder(config.telemetry_keyframe_interval, config.telemetry_deadbands,
+                                              self.fields)
+        self.batch_size = config.telemetry_batch_size
+        self.batch_interval = config.telemetry_batch_interval
+        self.batch: Deque[str] = deque()
+        self.queue_size = config.telemetry_queue_size
+        self.queue_policy = config.telemetry_queue_policy
+        self.decimate_factor = config.telemetry_decimate_factor
+        self.high_watermark = max(1, int(self.queue_size * config.telemetry_queue_high_watermark))
+        self.low_watermark = self.high_watermark // 2
+        self.overloaded = False
+        self.overload_listeners: List[Callable[[], None]] = []
+        self.dropped = 0
+        self.decimated = 0
+        self.samples = 0
+        self.frames_dropped = metrics.counter('frames_dropped_overload')
+        self.frames_decimated = metrics.counter('frames_decimated')
+        self.batch_ready = asyncio.Event()
+        self.batch_full = asyncio.Event()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.stages = []
+        self.outage_buffer: Optional[OutageBuffer] = None
+        self.replay_batch_size = config.telemetry_outage_replay_batch_size
+        self.retry_interval = config.telemetry_outage_retry_interval
+        self.retry_at = 0.0
+
+    def add_stage(self, stage):
+        self.stages.append(stage)
+
+    async def start(self):
+        if self.config.telemetry_outage_buffer_enabled:
+            self.outage_buffer = OutageBuffer(
+                self.config.telemetry_outage_buffer_path,
+                self.config.telemetry_outage_buffer_size,
+                self.config.telemetry_outage_buffer_policy,
+            )
+            if len(self.outage_buffer):
+                self.logger.info(f"{len(self.outage_buffer)} buffered telemetry frames to replay")
+        self.flush_task = asyncio.create_task(self.flusher())
+
+    async def stop(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+        while self.batch:
+            await self.flush()
+        if self.outage_buffer is not None:
+            self.outage_buffer.close()
+            self.outage_buffer = None
 
     async def send_telemetry(self, telemetry: Telemetry):
-        await self.redis.publish(self.config.redis_telemetry_channel, telemetry.json())
+        for stage in self.stages:
+            stage.process_telemetry(telemetry)
+        if not self.admit():
+            return
+        if self.delta_encoder is None:
+            payload = telemetry.model_dump_json(include=self.include)
+        else:
+            payload = self.delta_encoder.encode(telemetry)
+            if payload is None:
+                return
+        self.batch.append(payload)
+        if len(self.batch) >= self.batch_size:
+            self.batch_full.set()
+        self.batch_ready.set()
+
+    def admit(self) -> bool:
+        """Applies the overload policy, False if the sample is to be dropped."""
+        depth = len(self.batch)
+        if depth >= self.high_watermark and not self.overloaded:
+            self.set_overloaded(True)
+
+        if self.overloaded and self.queue_policy == 'decimate':
+            self.samples += 1
+            if self.samples % self.decimate_factor:
+                self.decimated += 1
+                self.frames_decimated.inc()
+                return False
+
+        if depth >= self.queue_size:
+            self.dropped += 1
+            self.frames_dropped.inc()
+            if self.queue_policy != 'drop_oldest':
+                return False
+            self.batch.popleft()
+        return True
+
+    def set_overloaded(self, overloaded: bool):
+        self.overloaded = overloaded
+        if overloaded:
+            self.logger.warning(f"telemetry queue above {self.high_watermark} frames, shedding load "
+                                f"({self.queue_policy})")
+        else:
+            self.logger.info(f"telemetry queue back to {len(self.batch)} frames, "
+                             f"{self.dropped} dropped and {self.decimated} decimated so far")
+        self.samples = 0
+        for listener in self.overload_listeners:
+            listener()
+
+    def queue_status(self) -> QueueStatus:
+        return QueueStatus(
+            depth=len(self.batch),
+            capacity=self.queue_size,
+            dropped=self.dropped,
+            decimated=self.decimated,
+            overloaded=self.overloaded,
+        )
+
+    async def flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.batch_ready.wait(), self.replay_timeout())
+            except asyncio.TimeoutError:
+                await self.replay()
+                continue
+            if not self.batch_full.is_set():
+                try:
+                    await asyncio.wait_for(self.batch_full.wait(), self.batch_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+
+    async def flush(self):
+        batch = [self.batch.popleft() for _ in range(min(self.batch_size, len(self.batch)))]
+        if self.overloaded and len(self.batch) <= self.low_watermark:
+            self.set_overloaded(False)
+        if len(self.batch) < self.batch_size:
+            self.batch_full.clear()
+        if not self.batch:
+            self.batch_ready.clear()
+        if not batch:
+            return
+
+        if self.has_backlog():
+            # keep the order, new frames queue up behind the backlog
+            self.frames_buffered.inc(len(batch))
+            self.outage_buffer.extend(batch)
+            await self.replay()
+            return
+
+        try:
+            await self.publish_batch(batch)
+        except Exception as ex:
+            self.publish_errors.inc()
+            if self.outage_buffer is None:
+                self.logger.error(f"failed to publish {len(batch)} telemetry frames: {ex}")
+                return
+            self.logger.error(f"redis unavailable, buffering telemetry on disk: {ex}")
+            self.frames_buffered.inc(len(batch))
+            self.outage_buffer.extend(batch)
+            self.retry_at = time.monotonic() + self.retry_interval
+
+    def has_backlog(self) -> bool:
+        return self.outage_buffer is not None and len(self.outage_buffer) > 0
+
+    def replay_timeout(self) -> Optional[float]:
+        return self.retry_interval if self.has_backlog() else None
+
+    async def replay(self):
+        if not self.has_backlog() or time.monotonic() < self.retry_at:
+            return
+
+        replayed = 0
+        while len(self.outage_buffer):
+            records = self.outage_buffer.peek(self.replay_batch_size)
+            try:
+                await self.publish_batch(records)
+            except Exception:
+                self.publish_errors.inc()
+                self.retry_at = time.monotonic() + self.retry_interval
+                break
+            self.outage_buffer.consume(len(records))
+            replayed += len(records)
+
+        if replayed:
+            self.logger.info(f"replayed {replayed} buffered telemetry frames, {len(self.outage_buffer)} left")
+
+    async def publish_batch(self, batch: List[str]):
+        started = time.perf_counter()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if self.config.telemetry_output == 'stream':
+                for payload in batch:
+                    pipe.xadd(self.config.redis_telemetry_stream, {self.stream_payload_field: payload},
+                              maxlen=self.config.telemetry_stream_maxlen, approximate=True)
+            else:
+                for payload in batch:
+                    pipe.publish(self.config.redis_telemetry_channel, payload)
+            await pipe.execute()
+        self.publish_time.observe(time.perf_counter() - started)
+        self.frames_published.inc(len(batch))
@@ -5,3 +5,11 @@ class SerialReadError(Exception):
 class SerialWriteError(Exception):
     """Вызывается при ошибках записи serial порта"""
     pass
+
+class FrameOverflowError(Exception):
+    """Вызывается когда кадр не помещается в буфер чтения"""
+    pass
+
+class FrameDecodeError(Exception):
+    """Вызывается при ошибках декодирования бинарного кадра"""
+    pass
@@ -3,7 +3,15 @@ import logging
 
 
 class BaseHandler:
+    """Supervised handler loop.
+
+    ``step`` must await the handler's own event source (a pubsub message,
+    serial data), the loop never sleeps on its own. A failing step is logged,
+    then the handler is re-initialized after an exponential backoff.
+    """
     handler_name = "base"
+    restart_backoff_min = 0.1
+    restart_backoff_max = 30.0
 
     def __init__(self, logger: logging.Logger):
         self.logger = logger
@@ -15,12 +23,26 @@ class BaseHandler:
     async def step(self) -> None:
         pass
 
+    async def shutdown(self) -> None:
+        pass
+
     async def run(self) -> None:
+        backoff = self.restart_backoff_min
         while True:
             try:
                 await self.step()
-                await asyncio.sleep(0.1)
-            except KeyboardInterrupt:
-                return
+                backoff = self.restart_backoff_min
+            except asyncio.CancelledError:
+                raise
             except Exception as ex:
                 self.logger.error(str(ex))
+                self.logger.warning(f"restarting in {backoff:.1f} sec")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.restart_backoff_max)
+                await self.restart()
+
+    async def restart(self) -> None:
+        try:
+            await self.init()
+        except Exception as ex:
+            self.logger.error(str(ex))
@@ -1,5 +1,7 @@
 import json
 import logging
+import time
+from typing import List, Optional
 
 import pydantic
 from redis.asyncio import Redis
@@ -8,8 +10,12 @@ from app.client.serialclient import SerialConfig
 from .. import BaseHandler
 from ...config.config import Config
 from ...controller.configcontroller.configcontroller import ConfigController
+from ...controller.derivedcontroller.derivedcontroller import DerivedController
+from ...controller.diagnosticscontroller.diagnosticscontroller import DiagnosticsController
 from ...controller.landcontroller.landcontroller import LandController
 from ...controller.telemetrycontroller.models import LandData
+from ...metrics import Metrics, disabled_metrics
+from ...payloads import DiagnosticsCommand
 
 
 class RedisHandler(BaseHandler):
@@ -19,10 +25,18 @@ class RedisHandler(BaseHandler):
             config_controller: ConfigController,
             land_controller: LandController,
             redis: Redis,
-            config: Config):
+            config: Config,
+            derived_controllers: List[DerivedController] = (),
+            diagnostics_controller: Optional[DiagnosticsController] = None,
+            metrics: Metrics = disabled_metrics):
         super().__init__(logger)
+        self.command_time = metrics.histogram('redis_command')
+        self.commands = metrics.counter('redis_commands')
+        self.command_errors = metrics.counter('redis_command_errors')
         self.config_controller = config_controller
         self.land_controller = land_controller
+        self.derived_controllers = list(derived_controllers)
+        self.diagnostics_controller = diagnostics_controller
         self.redis = redis
         self.pubsub = self.redis.pubsub()
         self.config_channel = config.redis_config_channel
@@ -30,38 +44,81 @@ class RedisHandler(BaseHandler):
         self.telemetry_channel = config.redis_telemetry_channel
         self.config_apply_channel = config.redis_config_apply_channel
         self.status_update_channel = config.redis_status_update_channel
+        self.derived_reset_channel = config.redis_derived_reset_channel
+        self.diagnostics_channel = config.redis_diagnostics_channel
 
     async def subscribe(self):
         try:
-            await self.pubsub.subscribe(**{
+            handlers = {
                 self.config_channel: self.config_handler,
                 self.land_queue_channel: self.land_data_handler,
-            })
+            }
+            if self.derived_controllers:
+                handlers[self.derived_reset_channel] = self.derived_reset_handler
+            if self.diagnostics_controller is not None:
+                handlers[self.diagnostics_channel] = self.diagnostics_handler
+            await self.pubsub.subscribe(**handlers)
         except Exception as ex:
             self.logger.error(str(ex))
 
     async def config_handler(self, message: dict):
+        started = time.perf_counter()
+        self.commands.inc()
         try:
             data = json.loads(message['data'].decode('UTF-8'))
             config = SerialConfig(**data)
             await self.config_controller.update_config(config)
         except json.JSONDecodeError as err:
+            self.command_errors.inc()
             self.logger.error(err)
         except pydantic.ValidationError as err:
+            self.command_errors.inc()
             self.logger.error(err)
+        self.command_time.observe(time.perf_counter() - started)
 
     async def land_data_handler(self, message: dict):
+        started = time.perf_counter()
+        self.commands.inc()
         try:
             data = json.loads(message['data'].decode('UTF-8'))
             land_data = LandData(**data)
             await self.land_controller.process_land_payload(land_data)
         except json.JSONDecodeError as err:
+            self.command_errors.inc()
             self.logger.error(err)
         except pydantic.ValidationError as err:
+            self.command_errors.inc()
             self.logger.error(err)
+        self.command_time.observe(time.perf_counter() - started)
+
+    async def derived_reset_handler(self, message: dict):
+        # any message resets, e.g. PUBLISH telemetry_derived_reset start
+        self.commands.inc()
+        for controller in self.derived_controllers:
+            controller.reset()
+        self.logger.info("derived telemetry reset")
+
+    async def diagnostics_handler(self, message: dict):
+        started = time.perf_counter()
+        self.commands.inc()
+        try:
+            data = json.loads(message['data'].decode('UTF-8'))
+            command = DiagnosticsCommand(**data)
+            await self.diagnostics_controller.execute(command)
+        except json.JSONDecodeError as err:
+            self.command_errors.inc()
+            self.logger.error(err)
+        except pydantic.ValidationError as err:
+            self.command_errors.inc()
+            self.logger.error(err)
+        self.command_time.observe(time.perf_counter() - started)
 
     async def step(self) -> None:
-        await self.pubsub.get_message()
+        # blocks until a message arrives, handlers are called by the pubsub
+        await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
 
     async def init(self):
         await self.subscribe()
+
+    async def shutdown(self) -> None:
+        await self.pubsub.close()
@@ -1,14 +1,17 @@
 import datetime
-import json
+import time
 from logging import Logger
-from typing import Optional
+from typing import Optional, Type
 
 import pydantic
 
-from app.controller.telemetrycontroller.models import Telemetry
-from app.errors import SerialReadError
+from app.controller.telemetrycontroller.binary import decode_ack, decode_telemetry, is_ack_frame, is_binary_frame
+from app.controller.telemetrycontroller.models import LandAck, Telemetry, TelemetryFrame
+from app.errors import FrameDecodeError
+from app.metrics import Metrics, disabled_metrics
 from .. import BaseHandler
 from ...client import ConnectionProvider
+from ...controller.landcontroller.landcontroller import LandController
 from ...controller.telemetrycontroller.telemetrycontroller import TelemetryController
 
 
@@ -18,40 +21,51 @@ class SerialHandler(BaseHandler):
     PAYLOAD_REQUEST = "Waiting for a new Payload"
     PAYLOAD_RECEIVED = "Got a new Payload"
 
-    def __init__(self, logger: Logger, conn_provider: ConnectionProvider, telemetry_controller: TelemetryController):
+    def __init__(
+            self,
+            logger: Logger,
+            conn_provider: ConnectionProvider,
+            telemetry_controller: TelemetryController,
+            land_controller: Optional[LandController],
+            frame_model: Type[TelemetryFrame] = TelemetryFrame,
+            metrics: Metrics = disabled_metrics):
         super().__init__(logger)
+        self.parse_time = metrics.histogram('parse')
+        self.parse_errors = metrics.counter('parse_errors')
+        self.acks = metrics.counter('acks')
         self.conn_provider = conn_provider
         self.telemetry_controller = telemetry_controller
+        self.land_controller = land_controller
+        self.frame_model = frame_model
 
     async def step(self):
         await self.process_serial()
 
     async def process_serial(self):
-        async with self.conn_provider as conn:
-            try:
-                data = await conn.read()
-                if data:
-                    # signal_processed = await self.process_signals(data)
-                    # if signal_processed:
-                    #     return
+        frames = await self.conn_provider.recv()
+        for data in frames:
+            signal_processed = await self.process_signals(data)
+            if signal_processed:
+                continue
 
-                    telemetry = await self.get_telemetry_payload(data)
-                    if telemetry is not None:
-                        await self.telemetry_controller.send_telemetry(telemetry)
-            except SerialReadError as err:
-                self.logger.error(err)
+            telemetry = await self.get_telemetry_payload(data)
+            if telemetry is not None:
+                await self.telemetry_controller.send_telemetry(telemetry)
 
-    async def get_telemetry_payload(self, data: str) -> Optional[Telemetry]:
+    async def get_telemetry_payload(self, data: bytes) -> Optional[Telemetry]:
+        started = time.perf_counter()
         try:
-            data = json.loads(data)
-            # TODO: fix created_at validation
-            data['created_at'] = datetime.datetime.now().isoformat()
-            data = Telemetry.parse_obj(data)
-            self.logger.debug(f'telemetry payload {data}')
-            return data
-        except json.JSONDecodeError as err:
+            if is_binary_frame(data):
+                telemetry = decode_telemetry(data)
+            else:
+                telemetry = self.frame_model.model_validate_json(data)
+            self.parse_time.observe(time.perf_counter() - started)
+            return telemetry
+        except FrameDecodeError as err:
+            self.parse_errors.inc()
             self.logger.error(err)
         except pydantic.ValidationError as err:
+            self.parse_errors.inc()
             self.logger.error(err)
 
     async def init(self):
@@ -60,11 +74,27 @@ class SerialHandler(BaseHandler):
             if not res:
                 self.logger.warning("Serial not available")
 
-    # async def process_signals(self, data: str) -> bool:  # TODO: think about it
-    #     if data == self.PAYLOAD_REQUEST:
-    #         await self.telemetry_controller.set_controller_status(ControllerStatus.waiting_for_payload)
-    #         return True
-    #     if data == self.PAYLOAD_RECEIVED:
-    #         await self.telemetry_controller.set_controller_status(ControllerStatus.controller_sending)
-    #         return True
-    #     return False
+    async def process_signals(self, data: bytes) -> bool:
+        try:
+            if is_ack_frame(data):
+                ack = decode_ack(data)
+            elif b'"ack"' in data:
+                ack = LandAck.model_validate_json(data)
+            else:
+                return False
+        except FrameDecodeError as err:
+            self.parse_errors.inc()
+            self.logger.error(err)
+            return True
+        except pydantic.ValidationError as err:
+            self.parse_errors.inc()
+            self.logger.error(err)
+            return True
+
+        self.acks.inc()
+        if self.land_controller is None:
+            # land messages only go to the primary device
+            self.logger.debug(f"ignoring ack {ack.ack}")
+            return True
+        await self.land_controller.process_ack(ack)
+        return True
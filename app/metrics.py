@@ -0,0 +1,142 @@
+import bisect
+from typing import Dict, List, Tuple
+
+# upper bounds of the latency histogram buckets, in seconds
+latency_buckets = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile.
+
+        A quantile past the last bucket reports the last bound, JSON and the
+        Redis hash have no infinity.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class NullCounter:
+    __slots__ = ()
+
+    def inc(self, amount: int = 1) -> None:
+        pass
+
+
+class NullHistogram:
+    __slots__ = ()
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+null_counter = NullCounter()
+null_histogram = NullHistogram()
+
+
+class Metrics:
+    """Registry of counters and fixed-bucket latency histograms.
+
+    Components fetch their metrics once at construction time. When metrics
+    are disabled they get shared no-op objects, so instrumented code costs a
+    method call per observation and nothing is ever recorded.
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = 'connector'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def counter(self, name: str):
+        if not self.enabled:
+            return null_counter
+        return self.counters.setdefault(name, Counter())
+
+    def histogram(self, name: str):
+        if not self.enabled:
+            return null_histogram
+        return self.histograms.setdefault(name, Histogram())
+
+    def scoped(self, scope: str) -> 'ScopedMetrics':
+        return ScopedMetrics(self, scope)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Flat view for the Redis hash: counters plus count/sum/p50/p99 per histogram."""
+        result: Dict[str, float] = {}
+        for name, counter in self.counters.items():
+            result[name] = counter.value
+        for name, histogram in self.histograms.items():
+            result[f'{name}_count'] = histogram.count
+            result[f'{name}_sum'] = histogram.sum
+            result[f'{name}_p50'] = histogram.quantile(0.5)
+            result[f'{name}_p99'] = histogram.quantile(0.99)
+        return result
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+        for name, counter in sorted(self.counters.items()):
+            lines.append(f'# TYPE {self.prefix}_{name}_total counter')
+            lines.append(f'{self.prefix}_{name}_total {counter.value}')
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f'{self.prefix}_{name}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum {histogram.sum}')
+            lines.append(f'{metric}_count {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class ScopedMetrics:
+    """View of a registry prefixing metric names with ``scope``, one per device."""
+
+    def __init__(self, metrics: Metrics, scope: str):
+        self.metrics = metrics
+        self.scope = scope
+
+    def counter(self, name: str):
+        return self.metrics.counter(f'{self.scope}_{name}')
+
+    def histogram(self, name: str):
+        return self.metrics.histogram(f'{self.scope}_{name}')
+
+
+disabled_metrics = Metrics(enabled=False)
@@ -1,8 +1,8 @@
 from datetime import datetime
-from enum import IntEnum
-from typing import Any
+from enum import Enum, IntEnum
+from typing import Any, Dict, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.client.serialclient import SerialConfig
 from app.status import AppStatus
@@ -21,9 +21,33 @@ class ConfigUpdated(BaseModel):
     config: SerialConfig
 
 
+class QueueStatus(BaseModel):
+    depth: int
+    capacity: int
+    dropped: int
+    decimated: int
+    overloaded: bool
+
+
 class UpdateStatus(BaseModel):
     timestamp: datetime
     status: AppStatus
+    telemetry_queues: Dict[str, QueueStatus] = {}
+
+
+class DiagnosticsCommand(BaseModel):
+    class Action(str, Enum):
+        slow_callbacks = 'slow_callbacks'
+        profile = 'profile'
+        tasks = 'tasks'
+
+    action: Action
+    enabled: bool = True  # slow_callbacks: switch detection on or off
+    threshold: float = Field(0.1, gt=0)  # slow_callbacks: seconds a callback may run
+    duration: float = 10.0  # profile: seconds to profile for
+    profiler: Literal['cprofile', 'sampling'] = 'cprofile'
+    limit: int = Field(30, ge=1)  # profile: functions or stacks in the report
+    save: bool = False  # write the result to diagnostics_path instead of publishing it
 
 
 class Payload(BaseModel):
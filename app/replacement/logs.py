@@ -1,19 +1,31 @@
 import logging
+from typing import Dict
 
 from app.config.config import Config
 from app.replacement.redis_logging_handler import RedisHandler
 
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+# one redis handler (and so one queue, worker and connection pool) per log channel
+redis_handlers: Dict[str, RedisHandler] = {}
+
+
+def get_redis_handler(cfg: Config) -> RedisHandler:
+    key = f"{cfg.redis_dsn}/{cfg.redis_log_channel}"
+    if key not in redis_handlers:
+        rh = RedisHandler(cfg)
+        rh.setLevel(logging.DEBUG)
+        rh.setFormatter(formatter)
+        redis_handlers[key] = rh
+    return redis_handlers[key]
+
 
 def setup_logger(name: str, cfg: Config) -> logging.Logger:
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     ch.setFormatter(formatter)
     logger.addHandler(ch)
-    rh = RedisHandler(cfg)
-    rh.setLevel(logging.DEBUG)
-    rh.setFormatter(formatter)
-    logger.addHandler(rh)
+    logger.addHandler(get_redis_handler(cfg))
     return logger
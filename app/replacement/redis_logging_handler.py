@@ -1,16 +1,87 @@
-from logging import StreamHandler, LogRecord
+import queue
+import threading
+from logging import Handler, LogRecord
 
 from app.config.config import Config
 from app.replacement.sync_redis import SyncRedis
 
 
-class RedisHandler(StreamHandler):
+class RedisHandler(Handler):
+    """Ships log records to Redis from a background thread.
+
+    ``emit`` only formats the record and puts it into a bounded queue, a single
+    worker thread drains the queue and publishes the messages in pipelined
+    batches. When the queue is full records are dropped and counted, the count
+    is reported with the next batch.
+    """
+    stop_timeout = 5.0
+
     def __init__(self, cfg: Config) -> None:
         super().__init__()
-        r = SyncRedis(cfg)
-        self.redis = r.get_redis()
+        self.redis = SyncRedis(cfg).get_redis()
         self.channel = cfg.redis_log_channel
+        self.batch_size = cfg.log_batch_size
+        self.queue: queue.Queue = queue.Queue(cfg.log_queue_size)
+        self.dropped = 0
+        # not the handler lock: logging.shutdown() holds that one while close() joins the worker
+        self.dropped_lock = threading.Lock()
+        self.worker = threading.Thread(target=self.ship, name="redis-log-shipper", daemon=True)
+        self.worker.start()
 
     def emit(self, record: LogRecord) -> None:
-        msg = self.format(record)
-        self.redis.publish(self.channel, msg)
+        try:
+            msg = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            self.queue.put_nowait(msg)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def ship(self) -> None:
+        while True:
+            msg = self.queue.get()
+            if msg is None:
+                return
+
+            batch = [msg]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    msg = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if msg is None:
+                    stop = True
+                    break
+                batch.append(msg)
+
+            with self.dropped_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                batch.append(f"log queue overflow, dropped {dropped} records")
+            self.publish(batch)
+            if stop:
+                return
+
+    def publish(self, batch) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for msg in batch:
+                pipe.publish(self.channel, msg)
+            pipe.execute()
+        except Exception:
+            # logging a failure to log would only feed the queue again
+            pass
+
+    def close(self) -> None:
+        if self.worker.is_alive():
+            try:
+                self.queue.put(None, timeout=self.stop_timeout)
+            except queue.Full:
+                pass
+            self.worker.join(self.stop_timeout)
+        super().close()
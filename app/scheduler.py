@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from logging import Logger
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app.metrics import Metrics, disabled_metrics
+
+JobCallback = Callable[[], Awaitable[None]]
+
+
+class Job:
+    __slots__ = ('name', 'callback', 'interval', 'due', 'cancelled', 'running',
+                 'run_time', 'lateness', 'missed_runs', 'errors')
+
+    def __init__(self, name: str, callback: JobCallback, interval: Optional[float], due: float, metrics: Metrics):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.due = due
+        self.cancelled = False
+        self.running = False
+        metric = re.sub(r'\W', '_', name)
+        self.run_time = metrics.histogram(f'job_{metric}')
+        self.lateness = metrics.histogram(f'job_{metric}_lateness')
+        self.missed_runs = metrics.counter(f'job_{metric}_missed')
+        self.errors = metrics.counter(f'job_{metric}_errors')
+
+
+class Scheduler:
+    """Single wakeup source for the periodic work of the connector.
+
+    Jobs live in a heap ordered by their due time on the monotonic clock and
+    one task sleeps until the earliest of them. Periodic jobs are due at
+    ``first + n * interval`` no matter how long a run took, so they do not
+    drift. Runs missed because the loop was blocked or the previous run was
+    still going are coalesced into a single run. Every run is a task of its
+    own, a slow job never delays the others.
+
+    Per job, run time and lateness (``job_<name>``, ``job_<name>_lateness``),
+    missed runs and errors go to the metrics registry.
+    """
+
+    def __init__(self, logger: Logger, metrics: Metrics = disabled_metrics):
+        self.logger = logger
+        self.metrics = metrics
+        self.heap: List[Tuple[float, int, Job]] = []
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.running: set = set()
+
+    def every(self, name: str, interval: float, callback: JobCallback, delay: Optional[float] = None) -> Job:
+        """Runs ``callback`` every ``interval`` seconds, first after ``delay`` (default ``interval``)."""
+        if interval <= 0:
+            raise ValueError(f"job {name}: interval must be positive")
+        return self.add(Job(name, callback, interval, time.monotonic() + (interval if delay is None else delay),
+                            self.metrics))
+
+    def call_later(self, name: str, delay: float, callback: JobCallback) -> Job:
+        """Runs ``callback`` once, ``delay`` seconds from now."""
+        return self.add(Job(name, callback, None, time.monotonic() + delay, self.metrics))
+
+    def add(self, job: Job) -> Job:
+        self.push(job)
+        return job
+
+    def push(self, job: Job):
+        heapq.heappush(self.heap, (job.due, next(self.counter), job))
+        if self.heap[0][2] is job:
+            self.wakeup.set()
+
+    def cancel(self, job: Job):
+        # the heap entry is skipped when it comes up
+        job.cancelled = True
+
+    async def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = list(self.running)
+        if self.task is not None:
+            tasks.append(self.task)
+            self.task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            due, _, job = self.heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.heap)
+            if job.cancelled:
+                continue
+            self.dispatch(job)
+            if job.interval is not None:
+                self.reschedule(job)
+
+    def dispatch(self, job: Job):
+        now = time.monotonic()
+        if job.running:
+            # the previous run is still going, this one is coalesced into it
+            job.missed_runs.inc()
+            return
+        job.lateness.observe(now - job.due)
+        job.running = True
+        task = asyncio.create_task(self.execute(job))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    def reschedule(self, job: Job):
+        job.due += job.interval
+        now = time.monotonic()
+        if job.due <= now:
+            missed = int((now - job.due) // job.interval) + 1
+            job.due += missed * job.interval
+            job.missed_runs.inc(missed)
+        self.push(job)
+
+    async def execute(self, job: Job):
+        started = time.perf_counter()
+        try:
+            await job.callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            job.errors.inc()
+            self.logger.error(f"job {job.name} failed: {ex}")
+        finally:
+            job.running = False
+            job.run_time.observe(time.perf_counter() - started)
@@ -5,3 +5,4 @@ class AppStatus(str, Enum):
     Starting = 'starting'
     Failing = 'failing'
     Running = 'running'
+    Degraded = 'degraded'
@@ -0,0 +1,297 @@
+"""End-to-end connector benchmark.
+
+Runs ``main.py`` in a subprocess against a pty pair standing in for the UART
+and an in-process fake Redis, then measures:
+
+* telemetry throughput and serial-write to Redis-publish latency at the
+  requested frame rates, plus a flat-out burst,
+* shore-to-boat latency from a PUBLISH on the land queue channel to the
+  message showing up on the serial line.
+
+Results are printed (or written with ``--output``) as JSON so runs of
+different versions can be compared::
+
+    python -m benchmarks.bench_connector --rates 20 100 500 --output bench.json
+    python -m benchmarks.bench_connector --binary --set TELEMETRY_OUTPUT=stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tty
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.controller.telemetrycontroller.binary import encode_telemetry
+from app.controller.telemetrycontroller.models import LandData, Telemetry
+from benchmarks.fake_redis import FakeRedis
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+telemetry_channel = b'telemetry'
+land_channel = b'land_queue_channel'
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    ms = [x * 1000 for x in latencies]
+    return {
+        'count': len(ms),
+        'p50_ms': percentile(ms, 50),
+        'p99_ms': percentile(ms, 99),
+        'max_ms': max(ms) if ms else None,
+        'mean_ms': statistics.fmean(ms) if ms else None,
+    }
+
+
+class SerialLine:
+    """The controller side of the pty: writes telemetry, reads land messages."""
+
+    def __init__(self, binary: bool):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.binary = binary
+        self.sent_at: Dict[int, float] = {}
+        self.land_received: Dict[int, float] = {}
+        self.closed = False
+        self.reader = threading.Thread(target=self.read_land, daemon=True)
+        self.reader.start()
+
+    def frame(self, seq: int) -> bytes:
+        telemetry = Telemetry(
+            controller_watts=250, time_to_go=seq, controller_volts=48.1, MPPT_volts=31.5, MPPT_watts=180.25,
+            motor_temp=41.5, motor_revols=1450.0, position_lat=55.751244, position_lng=37.618423,
+        )
+        if self.binary:
+            return encode_telemetry(telemetry)
+        return telemetry.model_dump_json(exclude={'created_at'}).encode() + b'\n'
+
+    def send(self, first: int, count: int, rate: Optional[float]):
+        """Writes ``count`` frames at ``rate`` frames per second (flat out if None)."""
+        started = time.monotonic()
+        for i in range(count):
+            if rate:
+                delay = started + i / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            seq = first + i
+            data = self.frame(seq)
+            self.sent_at[seq] = time.monotonic()
+            os.write(self.master, data)
+
+    def read_land(self):
+        buffer = b''
+        while not self.closed:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            now = time.monotonic()
+            *lines, buffer = (buffer + data).split(b'\n')
+            for line in lines:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if 'id' in message:
+                    self.land_received.setdefault(message['id'], now)
+
+    def close(self):
+        self.closed = True
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.published_at: Dict[int, float] = {}
+        self.redis = FakeRedis(self.on_publish)
+        self.line = SerialLine(args.binary)
+        self.workdir = tempfile.TemporaryDirectory(prefix='connector-bench-')
+        self.process: Optional[subprocess.Popen] = None
+        self.next_seq = 0
+
+    def on_publish(self, channel: bytes, payload: bytes, timestamp: float):
+        if channel != telemetry_channel and channel != self.args.stream.encode():
+            return
+        try:
+            seq = json.loads(payload)['time_to_go']
+        except (ValueError, KeyError, TypeError):
+            return
+        self.published_at.setdefault(seq, timestamp)
+
+    def connector_env(self, redis_port: int) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            'REDIS_DSN': f'redis://127.0.0.1:{redis_port}/1',
+            'REDIS_CONFIG_CHANNEL': 'serial_config',
+            'REDIS_CONFIG_APPLY_CHANNEL': 'serial_config_apply',
+            'REDIS_STATUS_UPDATE_CHANNEL': 'status_update',
+            'REDIS_TELEMETRY_CHANNEL': telemetry_channel.decode(),
+            'REDIS_TELEMETRY_STREAM': self.args.stream,
+            'REDIS_LOG_CHANNEL': 'connector_log',
+            'REDIS_LAND_QUEUE_CHANNEL': land_channel.decode(),
+            'SERIAL_PORT': self.line.port,
+        })
+        for item in self.args.set:
+            key, _, value = item.partition('=')
+            env[key] = value
+        return env
+
+    async def run(self) -> Dict:
+        redis_port = await self.redis.start()
+        os.makedirs(os.path.join(self.workdir.name, 'tmp'))
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(repo_root, 'main.py')],
+            cwd=self.workdir.name,
+            env=self.connector_env(redis_port),
+            stdout=subprocess.DEVNULL,
+            stderr=None if self.args.verbose else subprocess.DEVNULL,
+        )
+        try:
+            started = time.monotonic()
+            await asyncio.wait_for(self.redis.subscribed.wait(), self.args.startup_timeout)
+            startup = time.monotonic() - started
+            # give the reader task a moment to open the port after subscribing
+            await asyncio.sleep(0.5)
+
+            telemetry = []
+            for rate in self.args.rates:
+                telemetry.append(await self.telemetry_phase(rate, int(rate * self.args.duration)))
+            burst = await self.telemetry_phase(None, self.args.burst)
+            uplink = await self.uplink_phase()
+        finally:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.process.wait, 10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.line.close()
+            await self.redis.stop()
+            self.workdir.cleanup()
+
+        return {
+            'benchmark': 'connector',
+            'timestamp': datetime.now().isoformat(),
+            'version': self.version(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'frame_format': 'binary' if self.args.binary else 'json',
+            'settings': self.args.set,
+            'startup_s': startup,
+            'telemetry': telemetry,
+            'burst': burst,
+            'uplink': uplink,
+        }
+
+    async def telemetry_phase(self, rate: Optional[float], count: int) -> Dict:
+        first = self.next_seq
+        self.next_seq += count
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        await loop.run_in_executor(None, self.line.send, first, count, rate)
+
+        await self.wait_published(range(first, first + count))
+
+        seqs = range(first, first + count)
+        latencies = [self.published_at[s] - self.line.sent_at[s] for s in seqs if s in self.published_at]
+        published = [self.published_at[s] for s in seqs if s in self.published_at]
+        elapsed = (max(published) - started) if published else None
+        return {
+            'target_rate': rate,
+            'frames_sent': count,
+            'frames_published': len(latencies),
+            'frames_lost': count - len(latencies),
+            'throughput_fps': len(latencies) / elapsed if elapsed else None,
+            'latency': latency_summary(latencies),
+        }
+
+    async def wait_published(self, seqs: range):
+        """Waits until every frame is published or publishing stalls."""
+        deadline = time.monotonic() + self.args.drain_timeout
+        done, progress_at = -1, time.monotonic()
+        while time.monotonic() < deadline:
+            published = sum(1 for s in seqs if s in self.published_at)
+            if published == len(seqs):
+                return
+            if published != done:
+                done, progress_at = published, time.monotonic()
+            elif time.monotonic() - progress_at > 1.0:
+                return
+            await asyncio.sleep(0.01)
+
+    async def uplink_phase(self) -> Dict:
+        sent_at = {}
+        for i in range(self.args.uplink):
+            msg_id = 1_000_000 + i
+            land_data = LandData(priority=LandData.Priority(i % 2), created_at=datetime.now(), id=msg_id, data='x' * 32)
+            sent_at[msg_id] = time.monotonic()
+            await self.redis.publish(land_channel, land_data.model_dump_json().encode())
+            await asyncio.sleep(1 / self.args.uplink_rate)
+
+        deadline = time.monotonic() + self.args.drain_timeout
+        while time.monotonic() < deadline and len(self.line.land_received.keys() & sent_at.keys()) < len(sent_at):
+            await asyncio.sleep(0.01)
+
+        latencies = [self.line.land_received[i] - t for i, t in sent_at.items() if i in self.line.land_received]
+        return {
+            'messages_sent': len(sent_at),
+            'messages_delivered': len(latencies),
+            'latency': latency_summary(latencies),
+        }
+
+    @staticmethod
+    def version() -> Optional[str]:
+        try:
+            return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=repo_root,
+                                           text=True, stderr=subprocess.DEVNULL).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=float, nargs='+', default=[20, 100, 500], help='frame rates to test, fps')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per rate')
+    parser.add_argument('--burst', type=int, default=5000, help='frames written flat out')
+    parser.add_argument('--uplink', type=int, default=50, help='land messages to send')
+    parser.add_argument('--uplink-rate', type=float, default=20.0, help='land messages per second')
+    parser.add_argument('--binary', action='store_true', help='send COBS binary frames instead of JSON lines')
+    parser.add_argument('--stream', default='telemetry_stream', help='stream name when TELEMETRY_OUTPUT=stream')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra connector environment, e.g. TELEMETRY_BATCH_SIZE=64')
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('--drain-timeout', type=float, default=10.0)
+    parser.add_argument('--output', help='write the JSON result here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='show connector logs')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(Benchmark(args).run())
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
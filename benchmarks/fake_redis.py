@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+
+class FakeRedis:
+    """Minimal in-process RESP server standing in for Redis in benchmarks.
+
+    Understands what the connector uses: PUBLISH/SUBSCRIBE, XADD, HSET and a
+    few connection commands, everything else is answered with ``+OK``. Every
+    PUBLISH and XADD is reported to ``on_publish(channel, payload, timestamp)``
+    before it is fanned out to subscribers.
+    """
+
+    def __init__(self, on_publish: Optional[Callable[[bytes, bytes, float], None]] = None):
+        self.on_publish = on_publish
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.subscribed = asyncio.Event()
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = defaultdict(dict)
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.stream_ids = 0
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self.server = await asyncio.start_server(self.serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def publish(self, channel: bytes, payload: bytes) -> int:
+        receivers = list(self.subscribers.get(channel, ()))
+        message = self.encode([b'message', channel, payload])
+        for writer in receivers:
+            writer.write(message)
+        return len(receivers)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await self.read_command(reader)
+                if command is None:
+                    break
+                writer.write(await self.execute(command, writer))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for receivers in self.subscribers.values():
+                receivers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def execute(self, command: List[bytes], writer: asyncio.StreamWriter) -> bytes:
+        name = command[0].upper()
+        if name == b'PUBLISH':
+            if self.on_publish is not None:
+                self.on_publish(command[1], command[2], time.monotonic())
+            return b':%d\r\n' % await self.publish(command[1], command[2])
+        if name == b'XADD':
+            if self.on_publish is not None:
+                self.on_publish(command[1], command[-1], time.monotonic())
+            self.stream_ids += 1
+            return self.encode(b'%d-0' % self.stream_ids)
+        if name == b'SUBSCRIBE':
+            replies = []
+            for channel in command[1:]:
+                self.subscribers[channel].add(writer)
+                replies.append(self.encode([b'subscribe', channel, len(command) - 1]))
+            self.subscribed.set()
+            return b''.join(replies)
+        if name == b'UNSUBSCRIBE':
+            for channel in command[1:]:
+                self.subscribers[channel].discard(writer)
+            return self.encode([b'unsubscribe', command[1] if len(command) > 1 else None, 0])
+        if name == b'HSET':
+            fields = command[2:]
+            self.hashes[command[1]].update(zip(fields[::2], fields[1::2]))
+            return b':%d\r\n' % (len(fields) // 2)
+        if name == b'PING':
+            return b'+PONG\r\n'
+        return b'+OK\r\n'
+
+    @classmethod
+    def encode(cls, value) -> bytes:
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, list):
+            return b'*%d\r\n' % len(value) + b''.join(cls.encode(item) for item in value)
+        return b'$%d\r\n%s\r\n' % (len(value), value)